@@ -1,20 +1,17 @@
+import time
+started = time.perf_counter()
+
 import streamlit as st
-import plotly.express  as px
 
-from PIL import Image
+from utils.profiling import finish_run, milestone, start_run
+from utils.sidebar   import sidebar_header
 
 st.set_page_config(page_title='Home',
                    page_icon='🍛')
+start_run('Home', started)
 
 
-# image_path = 'D:/repos/FTC/'
-image = Image.open('logo.jpg')
-st.sidebar.image(image, width=120)
-
-st.sidebar.markdown('# Cury Company')
-st.sidebar.markdown('## Fastest Delivery in Town')
-
-st.sidebar.markdown('''___''')
+sidebar_header(st.sidebar)
 
 st.write("# Curry Company Growth Dashboard")
 st.markdown(
@@ -34,3 +31,5 @@ st.markdown(
     - Data Science Team on Discord
         - @daniel_asg
     ''')
+milestone('first paint')
+finish_run()
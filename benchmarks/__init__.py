@@ -0,0 +1 @@
+# Benchmark suite: synthetic datasets and timings of the cleaning and chart code.
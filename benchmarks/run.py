@@ -0,0 +1,241 @@
+# ----------------- Libraries -----------------
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+from datetime import timedelta
+
+import numpy  as np
+import pandas as pd
+import plotly
+
+from benchmarks.synthetic    import write_orders_csv
+from utils.chunked           import peak_rss, stream_build
+from utils.company_view      import (Order_share_by_week, country_maps, order_by_week, order_metric,
+                                     rolling_order_share, traffic_order_city, traffic_order_share)
+from utils.cubes             import build_cubes
+from utils.data_loader       import clean_code, prepare_dataset
+from utils.deliverers_view   import rating_by, rating_per_deliverer, top_delivers
+from utils.filters           import date_bounds
+from utils.maps              import density_map
+from utils.report            import PAGES, compute_report
+from utils.restaurant_view   import (avg_delivery_time_by_city, avg_rating_per_traffic,
+                                     avg_std_time_grapf, delivery_time_per_city_order_type)
+from utils.sketches          import build_sketches
+from utils.spatial           import build_spatial_index, nearest_restaurants, orders_within
+from utils.sql_backend       import Database, SqlCube, database_path, write_database
+from utils.summary           import summarize
+
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_REPEATS = 3
+DATA_DIR = 'bench_data'
+
+# Above this size the csv is not loaded in memory: only the chunked
+# snapshot build of utils.chunked is measured
+IN_MEMORY_LIMIT = 10_000_000
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def measure(function, repeats=DEFAULT_REPEATS):
+    '''
+    Runs a function several times and keeps the wall times.
+
+    Input: function without arguments and number of runs
+    Output: (result of the last run, dict with min_s, median_s and runs_s)
+    '''
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - start)
+    return result, {'min_s': min(seconds),
+                    'median_s': statistics.median(seconds),
+                    'runs_s': seconds}
+
+
+def serialize(result):
+    '''
+    What Streamlit sends to the browser: the figure spec, the table or
+    the value of a metric. Keeps the page timings honest about the cost
+    of building the payload.
+    '''
+    if hasattr(result, 'to_json'):
+        return result.to_json()
+    if hasattr(result, 'get_root'):
+        return result.get_root().render()
+    return json.dumps(result, default=str)
+
+
+def scenarios(df1):
+    '''
+    Filter settings measured for every size: the first load of a page
+    (whole period, every condition) and a narrower selection.
+
+    Output: dict name -> (date_slider, traffic_options, weather_options)
+    '''
+    first_date, last_date = date_bounds(df1)
+    middle = first_date + timedelta(days=(last_date - first_date).days // 2)
+    traffic = df1.Road_traffic_density.unique().tolist()
+    weather = df1.Weatherconditions.unique().tolist()
+    return {'default': (last_date, traffic, weather),
+            'filtered': (middle, traffic[:2], weather[:3])}
+
+
+def chart_functions(df1, cubes, sketches, database=None, index=None):
+    '''
+    Every chart/table function of the pages on the unfiltered data and,
+    with a Database, the ones aggregating the measures cube in SQLite.
+    With a SpatialIndex, the queries of the Nearby Orders tab around the
+    densest delivery cell.
+
+    Output: dict name -> function without arguments
+    '''
+    cube, deliverers = cubes.measures, cubes.deliverers
+    functions = {'order_metric': lambda: order_metric(cube),
+                 'traffic_order_share': lambda: traffic_order_share(cube),
+                 'traffic_order_city': lambda: traffic_order_city(cube),
+                 'order_by_week': lambda: order_by_week(cube),
+                 'Order_share_by_week': lambda: Order_share_by_week(cube, deliverers),
+                 'Order_share_by_week approx': lambda: Order_share_by_week(cube, sketches),
+                 'rolling_order_share': lambda: rolling_order_share(cube, deliverers),
+                 'country_maps': lambda: country_maps(df1),
+                 'density_map': lambda: density_map(df1),
+                 'rating_per_deliverer': lambda: rating_per_deliverer(df1),
+                 'rating_by traffic': lambda: rating_by(cube, 'Road_traffic_density'),
+                 'rating_by weather': lambda: rating_by(cube, 'Weatherconditions'),
+                 'top_delivers': lambda: top_delivers(df1),
+                 'summarize': lambda: summarize(df1),
+                 'summarize approx': lambda: summarize(df1, sketches),
+                 'avg_std_time_grapf': lambda: avg_std_time_grapf(cube),
+                 'delivery_time_per_city_order_type': lambda: delivery_time_per_city_order_type(cube),
+                 'avg_delivery_time_by_city': lambda: avg_delivery_time_by_city(df1),
+                 'avg_rating_per_traffic': lambda: avg_rating_per_traffic(cube)}
+    if database is not None:
+        sql_cube = SqlCube(database, date_bounds(df1)[1] + timedelta(days=1))
+        functions.update({
+            'traffic_order_city sqlite': lambda: traffic_order_city(sql_cube),
+            'order_by_week sqlite': lambda: order_by_week(sql_cube),
+            'rating_by traffic sqlite': lambda: rating_by(sql_cube, 'Road_traffic_density'),
+            'rating_by weather sqlite': lambda: rating_by(sql_cube, 'Weatherconditions'),
+            'delivery_time_per_city_order_type sqlite': lambda: delivery_time_per_city_order_type(sql_cube),
+            'avg_rating_per_traffic sqlite': lambda: avg_rating_per_traffic(sql_cube)})
+    if index is not None and len(index.deliveries):
+        lat, lng = index.deliveries.densest()
+        functions.update({
+            'orders_within 5 km': lambda: orders_within(df1, index, lat, lng, 5),
+            'nearest_restaurants 10': lambda: nearest_restaurants(df1, index, lat, lng, 10)})
+    return functions
+
+
+def bench_in_memory(path, repeats):
+    '''
+    Timings of the load-time work, of every chart function and of the
+    full pipeline of every page (filters, aggregations and payloads).
+    '''
+    results = {}
+    raw, results['read_csv'] = measure(lambda: pd.read_csv(path), 1)
+    _, results['clean_code'] = measure(lambda raw=raw: clean_code(raw), repeats)
+    df1, results['prepare_dataset'] = measure(lambda raw=raw: prepare_dataset(raw), repeats)
+    del raw
+    cubes, results['build_cubes'] = measure(lambda: build_cubes(df1), repeats)
+    sketches, results['build_sketches'] = measure(lambda: build_sketches(df1), repeats)
+    index, results['build_spatial_index'] = measure(lambda: build_spatial_index(df1), repeats)
+    target = database_path(path)
+    _, results['write_database'] = measure(lambda: write_database(cubes.measures, target, 'benchmark'), 1)
+    database = Database(target, 'benchmark')
+
+    results['charts'] = {}
+    for name, function in chart_functions(df1, cubes, sketches, database, index).items():
+        _, results['charts'][name] = measure(function, repeats)
+
+    results['pages'] = {}
+    for scenario, filters in scenarios(df1).items():
+        for page in PAGES:
+            run = lambda: [serialize(result)
+                           for result in compute_report(df1, cubes, *filters, pages=[page])[page].values()]
+            _, results['pages'][f'{page} | {scenario}'] = measure(run, repeats)
+    results['dataset_bytes'] = int(df1.memory_usage(deep=True).sum())
+    return results
+
+
+def machine_info():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'plotly': plotly.__version__,
+            'commit': commit}
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeats=DEFAULT_REPEATS, data_dir=DATA_DIR, seed=0):
+    '''
+    Generates (or reuses) one synthetic csv per size and benchmarks it.
+
+    Input: list of row counts, runs per measure, folder of the synthetic
+    files, random seed
+    Output: dict ready to be dumped as JSON
+    '''
+    report = {'machine': machine_info(), 'repeats': repeats, 'sizes': []}
+    for rows in sizes:
+        path = os.path.join(data_dir, f'orders_{rows}_{seed}.csv')
+        if not os.path.exists(path):
+            _, generate = measure(lambda: write_orders_csv(path, rows, seed), 1)
+            print(f'generated {path} in {generate["min_s"]:.1f}s')
+        entry = {'rows': rows, 'csv_bytes': os.path.getsize(path)}
+        if rows <= IN_MEMORY_LIMIT:
+            entry.update(bench_in_memory(path, repeats))
+        entry['stream_build'] = stream_build(path)
+        entry['peak_rss_bytes'] = peak_rss()
+        report['sizes'].append(entry)
+        print(f'{rows} rows: done')
+    return report
+
+
+def summary(report):
+    '''
+    Median seconds of every measure, one column per size.
+    '''
+    rows = {}
+    for entry in report['sizes']:
+        column = rows.setdefault(entry['rows'], {})
+        for name, value in entry.items():
+            if isinstance(value, dict) and 'median_s' in value:
+                column[name] = value['median_s']
+            elif name in ('charts', 'pages'):
+                column.update({f'{name}: {key}': timing['median_s'] for key, timing in value.items()})
+        column['stream_build'] = entry['stream_build']['seconds']
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    # e.g. python -m benchmarks.run --sizes 10000 1000000 50000000 --output bench.json
+    parser = argparse.ArgumentParser(description='Benchmarks the cleaning and chart code on synthetic data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS)
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench.json', help='machine-readable results')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sizes, args.repeats, args.data_dir, args.seed)
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2, default=str)
+    with pd.option_context('display.max_rows', None, 'display.float_format', '{:.4f}'.format):
+        print(summary(report))
+    print(f'results written to {args.output}')
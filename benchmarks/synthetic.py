@@ -0,0 +1,132 @@
+# ----------------- Libraries -----------------
+
+import argparse
+import os
+import time
+
+import numpy  as np
+import pandas as pd
+
+
+# Same layout and quirks as dataset/train.csv: padded strings, 'NaN ' as
+# missing value, 'conditions ' prefix on the weather and '(min) ' on the
+# delivery time, restaurant/deliverer codes like 'INDORES13DEL02 '
+COLUMNS = ['ID', 'Delivery_person_ID', 'Delivery_person_Age', 'Delivery_person_Ratings',
+           'Restaurant_latitude', 'Restaurant_longitude', 'Delivery_location_latitude',
+           'Delivery_location_longitude', 'Order_Date', 'Time_Orderd', 'Time_Order_picked',
+           'Weatherconditions', 'Road_traffic_density', 'Vehicle_condition', 'Type_of_order',
+           'Type_of_vehicle', 'multiple_deliveries', 'Festival', 'City', 'Time_taken(min)']
+
+CITY_CODES = ['INDO', 'BANG', 'COIMB', 'CHEN', 'HYD', 'RANCHI', 'MYS', 'DEH', 'KOC', 'PUNE',
+              'LUDH', 'KNP', 'MUM', 'KOL', 'JAP', 'SUR', 'GOA', 'AURG', 'AGR', 'VAD', 'ALH', 'BHP']
+FIRST_DATE = '2022-02-11'
+DAYS = 55
+
+WEATHER = (['conditions Sunny', 'conditions Stormy', 'conditions Sandstorms',
+            'conditions Cloudy', 'conditions Fog', 'conditions Windy', 'conditions NaN'],
+           [.16, .16, .16, .16, .16, .16, .04])
+TRAFFIC = (['Low ', 'Medium ', 'High ', 'Jam ', 'NaN '], [.33, .24, .10, .30, .03])
+ORDER_TYPES = (['Snack ', 'Meal ', 'Drinks ', 'Buffet '], None)
+VEHICLES = (['motorcycle ', 'scooter ', 'electric_scooter ', 'bicycle '], [.58, .33, .08, .01])
+FESTIVAL = (['No ', 'Yes ', 'NaN '], [.97, .02, .01])
+CITIES = (['Metropolitian ', 'Urban ', 'Semi-Urban ', 'NaN '], [.74, .22, .01, .03])
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def _pick(rng, choices, n):
+    values, weights = choices
+    return np.asarray(values, dtype=object)[rng.choice(len(values), n, p=weights)]
+
+
+def _with_nan(rng, values, share):
+    '''
+    Text version of a numeric column with a share of 'NaN ' sentinels.
+    '''
+    values = values.astype(str).astype(object)
+    values[rng.random(len(values)) < share] = 'NaN '
+    return values
+
+
+def generate_orders(n, seed=0, first_row=0):
+    '''
+    Synthetic raw orders with the schema and dirty values of train.csv.
+    Around 4% of the rows have a missing value somewhere, 5% a restaurant
+    with a flipped latitude sign and 1% the (0, 0) location.
+
+    Input: number of rows, random seed, offset of the first row (keeps
+    the IDs unique when the file is written in chunks)
+    Output: Dataframe of strings and floats, as read by pd.read_csv
+    '''
+    rng = np.random.default_rng([seed, first_row])
+    city = rng.integers(0, len(CITY_CODES), n)
+    restaurant = rng.integers(1, 21, n)
+    deliverer = rng.integers(1, 4, n)
+    codes = np.asarray(CITY_CODES, dtype=object)[city]
+    delivery_person = (codes + 'RES' + pd.Series(restaurant).map('{:02d}'.format).to_numpy(dtype=object)
+                       + 'DEL' + pd.Series(deliverer).map('{:02d} '.format).to_numpy(dtype=object))
+
+    latitude = rng.uniform(10, 30, n).round(6)
+    longitude = rng.uniform(70, 88, n).round(6)
+    latitude[rng.random(n) < 0.05] *= -1
+    zero = rng.random(n) < 0.01
+    latitude[zero] = 0
+    longitude[zero] = 0
+
+    dates = pd.Timestamp(FIRST_DATE) + pd.to_timedelta(rng.integers(0, DAYS, n), 'D')
+    minutes = rng.integers(10, 55, n)
+    return pd.DataFrame({
+        'ID': pd.Series(np.arange(first_row, first_row + n)).map('0x{:x} '.format).to_numpy(dtype=object),
+        'Delivery_person_ID': delivery_person,
+        'Delivery_person_Age': _with_nan(rng, rng.integers(20, 40, n), 0.04),
+        'Delivery_person_Ratings': _with_nan(rng, rng.uniform(2.5, 5, n).round(1), 0.04),
+        'Restaurant_latitude': latitude,
+        'Restaurant_longitude': longitude,
+        'Delivery_location_latitude': (np.abs(latitude) + rng.uniform(0.01, 0.1, n)).round(6),
+        'Delivery_location_longitude': (np.abs(longitude) + rng.uniform(0.01, 0.1, n)).round(6),
+        'Order_Date': dates.strftime('%d-%m-%Y'),
+        'Time_Orderd': '11:30:00',
+        'Time_Order_picked': '11:45:00',
+        'Weatherconditions': _pick(rng, WEATHER, n),
+        'Road_traffic_density': _pick(rng, TRAFFIC, n),
+        'Vehicle_condition': rng.integers(0, 3, n),
+        'Type_of_order': _pick(rng, ORDER_TYPES, n),
+        'Type_of_vehicle': _pick(rng, VEHICLES, n),
+        'multiple_deliveries': _with_nan(rng, rng.integers(0, 4, n), 0.02),
+        'Festival': _pick(rng, FESTIVAL, n),
+        'City': _pick(rng, CITIES, n),
+        'Time_taken(min)': '(min) ' + pd.Series(minutes).astype(str).to_numpy(dtype=object),
+    }, columns=COLUMNS)
+
+
+def write_orders_csv(path, n, seed=0, chunk_rows=1_000_000):
+    '''
+    Writes n synthetic orders to a csv file, chunk by chunk, so that files
+    far larger than the RAM (e.g. 50M rows) can be produced.
+
+    Input: file path, number of rows, random seed, rows per chunk
+    Output: path of the file
+    '''
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', newline='') as csv:
+        for first_row in range(0, n, chunk_rows):
+            chunk = generate_orders(min(chunk_rows, n - first_row), seed, first_row)
+            chunk.to_csv(csv, index=False, header=first_row == 0)
+    return path
+
+
+if __name__ == '__main__':
+    # e.g. python -m benchmarks.synthetic bench_data/orders_1m.csv --rows 1000000
+    parser = argparse.ArgumentParser(description='Writes a synthetic train.csv-like file.')
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=45_593)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    write_orders_csv(args.path, args.rows, args.seed, args.chunk_rows)
+    print(f'{args.rows} rows written to {args.path} in {time.perf_counter() - start:.1f}s')
@@ -1,174 +1,38 @@
 # ----------------- Libraries -----------------
 
-from haversine        import haversine
-from PIL              import Image
-from streamlit_folium import folium_static
-
-import folium
-import plotly.express  as px
-import numpy           as np
-import pandas          as pd
-import streamlit       as st
-
-
-# ==========================================================
-#                       Functions
-# ==========================================================
-
-def clean_code(df1):
-    '''
-    This function has the responsibility of clearing the dataframe.
-
-    Cleaning types:
-        1. Removing NaN data
-        2. Changing the type of the data column
-        3. Remove spaces from text variables
-        4. Formatting the given column
-        5. Clean up time column (remove text from numerical variable)
-        
-    Input: Dataframe
-    Output: Dataframe
-    '''
-    # Remove space from string
-    df1.ID = df1.ID.str.strip()
-    df1.Road_traffic_density = df1.Road_traffic_density.str.strip()
-    df1.Festival = df1.Festival.str.strip()
-    df1.City = df1.City.str.strip()
-    df1.Type_of_vehicle = df1.Type_of_vehicle.str.strip()
-    df1.Type_of_order = df1.Type_of_order.str.strip()
-    df1.Delivery_person_Age = df1.Delivery_person_Age.str.strip()
-    df1.multiple_deliveries = df1.multiple_deliveries.str.strip()
-
-    # Converting text/category/string to integers
-    linhas_sem_NaN = df1.Delivery_person_Age != 'NaN'
-    df1 = df1.loc[linhas_sem_NaN, :].copy()
-    df1.Delivery_person_Age = df1.Delivery_person_Age.astype(int)
-
-    linhas_sem_NaN = df1.multiple_deliveries != 'NaN'
-    df1 = df1.loc[linhas_sem_NaN, :].copy()
-    df1.multiple_deliveries = df1.multiple_deliveries.astype(int)
-
-    # Converting text/category/string to float
-    df1.Delivery_person_Ratings = df1.Delivery_person_Ratings.astype(float)
-
-    # Converting text/category/string to Datetime
-    df1.Order_Date = pd.to_datetime(df1.Order_Date, format='%d-%m-%Y')
-
-    # Command to remove text from numbers
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].str.extract(r'(\d+)').astype(int)
-
-    # Command to remove unnecessary text
-    df1.Weatherconditions = df1.Weatherconditions.str.replace('conditions ', '')
-
-    # Removal of lines containing 'NaN
-    df1 = df1.loc[df1.Road_traffic_density != 'NaN', :].copy()
-    df1 = df1.loc[df1.City != 'NaN', :].copy()
-    df1 = df1.loc[df1.Festival != 'NaN', :].copy()
-    return df1
-
-
-def order_metric(df1):
-    cols = ['ID', 'Order_Date']
-    aux = (df1[cols].groupby('Order_Date')
-                    .count()
-                    .rename(columns={'ID':'Order_quantity'})
-                    .reset_index())
-    fig = px.bar(aux, x='Order_Date', y='Order_quantity')
-    return fig
-
-
-def traffic_order_share(df1):
-    cols = ['ID', 'Road_traffic_density']
-    aux = (df1[cols].groupby('Road_traffic_density')
-                    .count()
-                    .reset_index()
-                    .rename(columns={'ID':'Order_quantity'}))
-    aux = aux[aux['Road_traffic_density'] != 'NaN']
-    fig = px.pie(aux, 
-                 values='Order_quantity', 
-                 names='Road_traffic_density', 
-                 title='Order distribution per Road_traffic_density',
-                 color_discrete_sequence=px.colors.qualitative.Plotly)
-    return fig
-
-
-def traffic_order_city(df1):
-    cols = ['ID', 'Road_traffic_density', 'City']
-    aux = (df1[cols].groupby(['Road_traffic_density', 'City'])
-                    .count()
-                    .reset_index()
-                    .rename(columns={'ID':'volume_of_orders'}))
-    aux = aux[aux['City'] != 'NaN']
-    aux = aux[aux['Road_traffic_density'] != 'NaN']
-    fig = px.scatter(aux , 
-                     x="City", 
-                     y="Road_traffic_density", 
-                     size="volume_of_orders", 
-                     color='City',
-                     size_max=70,
-                     color_discrete_sequence=px.colors.qualitative.Plotly)
-    return fig
-
-
-def order_by_week(df1):
-    cols = ['ID', 'Order_Date']
-    aux = df1[cols]
-    aux['Week'] = aux.Order_Date.dt.strftime('%U')
-    aux = (aux.groupby('Week')
-              .count()
-              .reset_index()
-              .rename(columns={'ID':'Order_quantity'}))
-    aux.Week = aux.Week.astype(int)
-    fig = px.line(aux, x='Week', y='Order_quantity')
-    return fig
-
-
-def Order_share_by_week(df1):
-    cols = ['ID', 'Order_Date', 'Delivery_person_ID']
-    aux = df1[cols]
-    aux['Week'] = aux.Order_Date.dt.strftime('%U')
-    aux = (aux.groupby('Week')
-              .agg({'ID':'count', 'Delivery_person_ID':'nunique'})
-              .reset_index()
-              .rename(columns={'ID':'volume_of_orders', 'Delivery_person_ID':'Deliverers_quantity'}))
-    aux['Orders_per_deliverers'] = aux.volume_of_orders / aux.Deliverers_quantity
-    aux.Week = aux.Week.astype(int)
-    fig = px.line(aux, x='Week', y='Orders_per_deliverers')
-    return fig
-
-
-def country_maps(df1):
-        cols = ['City', 'Road_traffic_density', 'Delivery_location_latitude', 'Delivery_location_longitude']
-        aux = (df1[cols].groupby(['City', 'Road_traffic_density'])
-                        .median()
-                        .reset_index())
-        aux = aux[aux['City'] != 'NaN']
-        aux = aux[aux['Road_traffic_density'] != 'NaN']
-        m = folium.Map(location=[aux.Delivery_location_latitude.mean(),
-                                 aux.Delivery_location_longitude.mean()],
-                       zoom_start=7,
-                       control_scale=True)
-        for index, location_info in aux.iterrows():
-            folium.Marker(location=[location_info['Delivery_location_latitude'],
-                                    location_info['Delivery_location_longitude']],
-                          popup=location_info[['City', 'Road_traffic_density']]).add_to(m)
-        folium_static(m, width=1024, height=600)
-        return None
+import time
+started = time.perf_counter()
+
+import streamlit                as st
+import streamlit.components.v1 as components
+
+from utils.company_view import country_maps
+from utils.data_loader  import dataset_version, load_cubes, load_dataset, load_sketches
+from utils.executor     import run_sections
+from utils.figure_cache import filter_key, session_cache
+from utils.maps         import cached_map_html, density_map
+from utils.profiling    import finish_run, milestone, record_payload, render_timings, stage, start_run
+from utils.report       import company_sections, filter_page, live_sections
+from utils.sidebar      import sidebar_filters, sidebar_footer
+from utils.sketches     import DISTINCT_MODE
+from utils.stream       import REFRESH_SECONDS, STREAM_SOURCE, filter_live, start_stream
+from utils.sql_backend  import BACKEND, load_database
+
+
 # ----------------- Start of the logical code structure -----------------
 
 st.set_page_config(page_title='Company View',
                    page_icon='📈',
                    layout="wide")
+profiler = start_run('Company View', started)
 
 # -----------------
-# Import Dataset
-# -----------------
-df = pd.read_csv('dataset/train.csv')
-
-# -----------------
-# Cleaning Dataset
+# Import and Clean Dataset
 # -----------------
-df1 = clean_code(df)
+with stage('load dataset', 'load'):
+    df1 = load_dataset()
+    cubes = load_cubes()
+    version = dataset_version()
 
 
 st.header('Marketplace - Company View')
@@ -176,35 +40,43 @@ st.header('Marketplace - Company View')
 # #########################
 #         Sidebar
 # #########################
-# image_path = 'D:/repos/FTC/'
-image = Image.open('logo.jpg')
-st.sidebar.image(image, width=120)
-st.sidebar.markdown('# Cury Company')
-st.sidebar.markdown('## Fastest Delivery in Town')
+date_slider, traffic_options, _ = sidebar_filters(st.sidebar, df1, version)
 
 st.sidebar.markdown('''___''')
-st.sidebar.markdown('## select the cut-off date')
-date_slider = st.sidebar.slider('Up to what value?',
-                                value=pd.datetime(2022,4,13),
-                                min_value=pd.datetime(2022,2,11),
-                                max_value=pd.datetime(2022,4,6),
-                                format='DD-MM-YYYY')
-
-st.sidebar.markdown('''___''')
-traffic_options = st.sidebar.multiselect('What are the traffic conditions?',
-                                         df1.Road_traffic_density.unique().tolist(),
-                                         default=df1.Road_traffic_density.unique().tolist())
-
-st.sidebar.markdown('''___''')
-st.sidebar.markdown('### Powered by Comunidade DS')
-
-# date filter
-rows = df1.Order_Date < date_slider
-df1 = df1.loc[rows,:]
-
-# traffic filter
-rows = df1.Road_traffic_density.isin(traffic_options)
-df1 = df1.loc[rows,:]
+approximate = st.sidebar.checkbox('Approximate unique deliverers (HyperLogLog, about 1.6% error)',
+                                  value=DISTINCT_MODE == 'approx')
+live = start_stream() if STREAM_SOURCE else None
+live_mode = False
+if live is not None:
+    st.sidebar.markdown('''___''')
+    live_mode = st.sidebar.checkbox('Live order stream', value=True)
+sidebar_footer(st.sidebar)
+
+# date and traffic filters
+with stage('filters', 'filter'):
+    if live_mode:
+        cube, deliverers = filter_live(live, traffic_options)
+    else:
+        sketches = load_sketches() if approximate else None
+        database = load_database() if BACKEND == 'sqlite' else None
+        df1, cube, deliverers = filter_page('company', df1, cubes, date_slider, traffic_options,
+                                            sketches=sketches, database=database)
+
+# every chart of the three tabs starts computing in the background, the
+# first tab first; the map is built on a cache miss only
+if live_mode:
+    # the live cubes change between reruns: nothing to cache
+    sections = run_sections(live_sections('company', cube, deliverers), session_state=st.session_state)
+    status = live.status()
+    st.caption(f"Live: {status['events']} orders received, {status['rejected']} unparseable, "
+               f"{status['filtered']} dropped by the cleaning ('NaN' fields)")
+else:
+    sections = company_sections(df1, cube, deliverers)
+    sections.pop('country_maps')
+    sections = run_sections(sections,
+                            cache=session_cache(st.session_state, version),
+                            key=('company',) + filter_key(date_slider, traffic_options, None, approximate),
+                            session_state=st.session_state)
 
 
 
@@ -217,28 +89,60 @@ with tab1:
     with st.container():
         # Order Metric
         st.markdown('# Orders by day')
-        fig = order_metric(df1)
-        st.plotly_chart(fig, use_container_width=True)
+        order_metric = sections.result('order_metric')
+        with stage('order_metric', 'render'):
+            st.plotly_chart(order_metric, use_container_width=True)
+        milestone('first paint')
     with st.container():
         col1, col2 = st.columns(2)
         with col1:
             st.header('Traffic Order Share')
-            fig = traffic_order_share(df1)
-            st.plotly_chart(fig, use_container_width=True)            
+            traffic_order_share = sections.result('traffic_order_share')
+            with stage('traffic_order_share', 'render'):
+                st.plotly_chart(traffic_order_share, use_container_width=True)
         with col2:
             st.header('Traffic Order City')
-            fig = traffic_order_city(df1)
-            st.plotly_chart(fig, use_container_width=True)
+            traffic_order_city = sections.result('traffic_order_city')
+            with stage('traffic_order_city', 'render'):
+                st.plotly_chart(traffic_order_city, use_container_width=True)
 with tab2:
     with st.container():
         st.markdown('# Order by week')
-        fig = order_by_week(df1)
-        st.plotly_chart(fig, use_container_width=True)
+        order_by_week = sections.result('order_by_week')
+        with stage('order_by_week', 'render'):
+            st.plotly_chart(order_by_week, use_container_width=True)
     with st.container():
         st.markdown('# Order share by week')
-        fig = Order_share_by_week(df1)
-        st.plotly_chart(fig, use_container_width=True)
+        order_share = sections.result('Order_share_by_week')
+        with stage('Order_share_by_week', 'render'):
+            st.plotly_chart(order_share, use_container_width=True)
+    with st.container():
+        st.markdown('# Orders per deliverer, trailing days')
+        rolling_order_share = sections.result('rolling_order_share')
+        with stage('rolling_order_share', 'render'):
+            st.plotly_chart(rolling_order_share, use_container_width=True)
 with tab3:
     st.markdown('# Country Maps')
-    country_maps(df1)
+    if live_mode:
+        st.info('The maps are drawn from the orders themselves: turn off the live stream to see them.')
+    else:
+        map_mode = st.radio('Map mode',
+                            ['Central location by city and traffic', 'All delivery locations'],
+                            horizontal=True)
+        if map_mode == 'All delivery locations':
+            build_map = lambda: density_map(df1)
+        else:
+            build_map = lambda: country_maps(df1)
+        map_key = (map_mode, version) + filter_key(date_slider, traffic_options)
+        with stage('country_maps', 'render'):
+            html = cached_map_html(map_key, build_map)
+            components.html(html, width=1024, height=610)
+        record_payload('country_maps', len(html))
+
+finish_run()
+render_timings(profiler, st.sidebar, session_cache(st.session_state, version))
+
+if live_mode:
+    time.sleep(REFRESH_SECONDS)
+    st.experimental_rerun()
     
\ No newline at end of file
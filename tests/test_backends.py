@@ -0,0 +1,171 @@
+# ----------------- Libraries -----------------
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_orders
+from utils.cubes           import build_cubes, count_deliverers, rollup
+from utils.data_loader     import clean_code, prepare_dataset
+from utils.deliverers_view import rating_per_deliverer, top_delivers
+from utils.filters         import apply_filters
+from utils.sql_backend     import Database, SqlCube, write_database
+
+
+# Synthetic orders, with the dirty values of train.csv
+ROWS = 5_000
+
+# Filters of the pages: cut-off date, traffic and weather (None keeps all)
+FILTERS = [(pd.Timestamp.max, None, None),
+           (pd.Timestamp('2022-03-10'), ['Low', 'Jam'], None),
+           (pd.Timestamp('2022-03-20'), ['Medium', 'High'], ['Sunny', 'Fog'])]
+
+ROLLUPS = ['City', 'Order_Date', 'Weatherconditions',
+           ['City', 'Road_traffic_density'], ['City', 'Type_of_order']]
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def reference_clean_code(df1):
+    '''
+    clean_code as the pages first shipped it, row by row on strings: the
+    reference the vectorized cleaning must match.
+    '''
+    for column in ['ID', 'Road_traffic_density', 'Festival', 'City', 'Type_of_vehicle',
+                   'Type_of_order', 'Delivery_person_Age', 'multiple_deliveries']:
+        df1[column] = df1[column].str.strip()
+    df1 = df1.loc[df1.Delivery_person_Age != 'NaN', :].copy()
+    df1.Delivery_person_Age = df1.Delivery_person_Age.astype(int)
+    df1 = df1.loc[df1.multiple_deliveries != 'NaN', :].copy()
+    df1.multiple_deliveries = df1.multiple_deliveries.astype(int)
+    df1.Delivery_person_Ratings = df1.Delivery_person_Ratings.astype(float)
+    df1.Order_Date = pd.to_datetime(df1.Order_Date, format='%d-%m-%Y')
+    df1['Time_taken(min)'] = df1['Time_taken(min)'].str.extract(r'(\d+)').astype(int)
+    df1.Weatherconditions = df1.Weatherconditions.str.replace('conditions ', '')
+    df1 = df1.loc[df1.Road_traffic_density != 'NaN', :].copy()
+    df1 = df1.loc[df1.City != 'NaN', :].copy()
+    df1 = df1.loc[df1.Festival != 'NaN', :].copy()
+    return df1
+
+
+def reference_rollup(df1, by):
+    # The aggregations of the pages on the raw rows
+    aux = (df1.groupby(by, observed=True)
+              .agg(orders=('ID', 'count'),
+                   avg_time=('Time_taken(min)', 'mean'),
+                   std_time=('Time_taken(min)', 'std'),
+                   avg_rating=('Delivery_person_Ratings', 'mean'),
+                   std_rating=('Delivery_person_Ratings', 'std'))
+              .sort_index())
+    return aux.astype(float)
+
+
+def as_text(df1):
+    # Category columns back to plain text, for comparisons with the reference
+    return df1.astype({column: object for column in df1.select_dtypes('category').columns})
+
+
+@pytest.fixture(scope='module')
+def raw():
+    return generate_orders(ROWS, seed=1)
+
+
+@pytest.fixture(scope='module')
+def df1(raw):
+    return prepare_dataset(raw)
+
+
+@pytest.fixture(scope='module')
+def cubes(df1):
+    return build_cubes(df1)
+
+
+@pytest.fixture(scope='module')
+def database(cubes, tmp_path_factory):
+    target = str(tmp_path_factory.mktemp('sqlite') / 'orders.sqlite')
+    write_database(cubes.measures, target, 'test')
+    return Database(target, 'test')
+
+
+def test_clean_code_matches_reference(raw):
+    expected = reference_clean_code(raw.copy())
+    result = as_text(clean_code(raw.copy()))
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_rating_means_match_reference(raw, df1):
+    # The Deliverers View shows the mean rating of each deliverer rounded
+    # to 2 decimals: a float32 column moves some of them by 0.01
+    reference = reference_clean_code(raw.copy()).sort_values('Order_Date', kind='mergesort')
+    expected = reference.groupby('Delivery_person_ID').Delivery_person_Ratings.mean()
+    result = df1.groupby('Delivery_person_ID', observed=True).Delivery_person_Ratings.mean()
+    result.index = result.index.astype(object)
+    result = result.sort_index()
+    pd.testing.assert_series_equal(result, expected)
+    pd.testing.assert_series_equal(round(result, 2), round(expected, 2))
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_rating_per_deliverer_matches_reference(raw, df1, filters):
+    # The table of the original page, on the same rows in the same order
+    reference = reference_clean_code(raw.copy()).sort_values('Order_Date', kind='mergesort')
+    reference = apply_filters(reference.reset_index(drop=True), *filters)
+    expected = round(reference.loc[:, ['Delivery_person_ID', 'Delivery_person_Ratings']]
+                              .groupby('Delivery_person_ID').mean().reset_index(), 2)
+    result = rating_per_deliverer(apply_filters(df1, *filters))
+    pd.testing.assert_frame_equal(result.sort_values('Delivery_person_ID', ignore_index=True), expected)
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+@pytest.mark.parametrize('by', ROLLUPS)
+def test_cube_rollup_matches_groupby(df1, cubes, filters, by):
+    expected = reference_rollup(apply_filters(df1, *filters), by)
+    result = rollup(apply_filters(cubes.measures, *filters), by).astype(float)
+    pd.testing.assert_frame_equal(result[expected.columns], expected,
+                                  check_index_type=False, check_categorical=False, rtol=1e-5)
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+@pytest.mark.parametrize('by', ROLLUPS)
+def test_sqlite_rollup_matches_pandas(cubes, database, filters, by):
+    expected = rollup(apply_filters(cubes.measures, *filters), by)
+    result = rollup(SqlCube(database, *filters), by)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_index_type=False, rtol=1e-9)
+
+
+def test_write_database_leaves_no_temporary_file(cubes, tmp_path):
+    target = str(tmp_path / 'orders.sqlite')
+    write_database(cubes.measures, target, 'test')
+    write_database(cubes.measures, target, 'test')
+    assert [path.name for path in tmp_path.iterdir()] == ['orders.sqlite']
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_unique_deliverers_match_nunique(df1, cubes, filters):
+    orders = apply_filters(df1, *filters)
+    expected = orders.groupby('Order_Date').Delivery_person_ID.nunique().sort_index()
+    result = count_deliverers(apply_filters(cubes.deliverers, *filters), 'Order_Date')
+    pd.testing.assert_series_equal(result, expected, check_dtype=False)
+
+
+def test_clean_code_accepts_numeric_columns(raw):
+    # A chunk or partition without 'NaN ' gets these columns as numbers from read_csv
+    numeric = ['Delivery_person_Age', 'multiple_deliveries']
+    complete = raw[(raw[numeric] != 'NaN ').all(axis=1)]
+    parsed = complete.astype({column: int for column in numeric})
+    pd.testing.assert_frame_equal(clean_code(parsed), clean_code(complete.copy()))
+
+
+@pytest.mark.parametrize('k', [1, 3, 10])
+def test_top_delivers_breaks_ties_by_id(df1, k):
+    # The synthetic times are whole minutes: many deliverers tie at the k-th mean
+    means = (df1.groupby(['City', 'Delivery_person_ID'], observed=True)['Time_taken(min)']
+                .mean().reset_index())
+    ranking = top_delivers(df1, k)
+    for result, ascending in [(ranking.fastest, True), (ranking.slowest, False)]:
+        expected = (means.sort_values(['City', 'Time_taken(min)', 'Delivery_person_ID'],
+                                      ascending=[True, ascending, True])
+                         .groupby('City', observed=True).head(k))
+        pd.testing.assert_frame_equal(as_text(result), as_text(expected.reset_index(drop=True)),
+                                      check_dtype=False)
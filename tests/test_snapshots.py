@@ -0,0 +1,45 @@
+# ----------------- Libraries -----------------
+
+import os
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_orders
+from utils.chunked        import stream_build
+from utils.cubes          import build_cubes
+from utils.data_loader    import build_snapshot, prepare_dataset, read_cubes, snapshot_is_fresh
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def test_snapshot_is_stale_for_a_restored_older_csv(tmp_path):
+    path = str(tmp_path / 'orders.csv')
+    generate_orders(200, seed=3).to_csv(path, index=False)
+    build_snapshot(path)
+    assert snapshot_is_fresh(path)
+
+    # a backup restored with its own, older mtime (cp -p, rsync -t)
+    generate_orders(300, seed=4).to_csv(path, index=False)
+    os.utime(path, ns=(0, 0))
+    assert not snapshot_is_fresh(path)
+
+
+def as_rows(cube):
+    # Category columns as text, rows in a fixed order
+    cube = cube.astype({column: str for column in cube.select_dtypes('category').columns})
+    return cube.sort_values(list(cube.columns), ignore_index=True)
+
+
+def test_stream_build_matches_build_cubes(tmp_path):
+    path = str(tmp_path / 'orders.csv')
+    generate_orders(3_000, seed=5).to_csv(path, index=False)
+    stream_build(path, chunksize=250)
+    expected = build_cubes(prepare_dataset(pd.read_csv(path)))
+    result = read_cubes(path)
+    for name in expected._fields:
+        pd.testing.assert_frame_equal(as_rows(getattr(result, name)), as_rows(getattr(expected, name)),
+                                      check_dtype=False)
+    assert sorted(os.listdir(tmp_path)) == ['orders.csv', 'orders.deliverers.feather',
+                                            'orders.feather', 'orders.measures.feather']
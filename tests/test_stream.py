@@ -0,0 +1,65 @@
+# ----------------- Libraries -----------------
+
+import asyncio
+import json
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_orders
+from utils.data_loader    import prepare_dataset
+from utils.stream         import LiveCubes, consume, parse_events
+
+
+# Values the cleaning cannot parse, one per event
+INVALID = [('Vehicle_condition', 'x'), ('Restaurant_latitude', 'north'),
+           ('Order_Date', '2022-03-19'), ('Time_taken(min)', '(min) ?'),
+           ('Delivery_person_Age', 'old'), ('Delivery_person_Ratings', 'good'),
+           ('multiple_deliveries', '1.5')]
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+@pytest.fixture(scope='module')
+def raw():
+    return generate_orders(500, seed=2)
+
+
+def as_lines(raw):
+    return [json.dumps(event) for event in raw.to_dict('records')]
+
+
+def test_parse_events_matches_csv_cleaning(raw):
+    events, rejected = parse_events(as_lines(raw) + ['not json', '[]', '{}'])
+    assert rejected == 3
+    pd.testing.assert_frame_equal(prepare_dataset(events), prepare_dataset(raw.copy()))
+
+
+@pytest.mark.parametrize('column, value', INVALID)
+def test_parse_events_drops_only_invalid_events(raw, column, value):
+    bad = raw.iloc[:1].assign(**{column: value})
+    events, rejected = parse_events(as_lines(bad) + as_lines(raw))
+    assert rejected == 1
+    pd.testing.assert_frame_equal(prepare_dataset(events), prepare_dataset(raw.copy()))
+
+
+def test_status_counts_rejected_and_filtered_apart(raw):
+    live = LiveCubes()
+    bad = raw.iloc[:1].assign(Order_Date='2022-03-19')
+    lines = as_lines(bad) + as_lines(raw)
+
+    async def run():
+        queue = asyncio.Queue()
+        for line in lines:
+            queue.put_nowait(line)
+        consumer = asyncio.create_task(consume(queue, live, batch_seconds=0.05))
+        await asyncio.sleep(0.3)
+        consumer.cancel()
+
+    asyncio.run(run())
+    status = live.status()
+    filtered = len(raw) - len(prepare_dataset(raw.copy()))
+    assert (status['events'], status['rejected'], status['filtered']) == (len(lines), 1, filtered)
+    assert filtered > 0
@@ -0,0 +1,195 @@
+# ----------------- Libraries -----------------
+
+import argparse
+import itertools
+import math
+import os
+import resource
+import sys
+import time
+
+import numpy  as np
+import pandas as pd
+
+from utils.cubes       import build_cubes
+from utils.data_loader import (CATEGORY_COLUMNS, DATASET_PATH, ENTITY_COLUMNS, feather, pa,
+                               prepare_dataset, snapshot_metadata, snapshot_path,
+                               source_stamp, write_snapshot)
+from utils.ingest      import merge_measures
+
+
+DEFAULT_CHUNKSIZE = 250_000
+
+# Files the deliverers of the chunks are spilled to, by hash of the ID,
+# at most (open at the same time during the build)
+MAX_SPILL_PARTITIONS = 256
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def iter_clean_chunks(path=DATASET_PATH, chunksize=DEFAULT_CHUNKSIZE):
+    '''
+    Reads the csv file in chunks and applies the clean_code rules (plus the
+    derived columns of prepare_dataset) to each chunk, so only one raw
+    chunk is in memory at a time.
+
+    Input: path of the csv file and number of rows per chunk
+    Output: generator of cleaned Dataframes
+    '''
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        yield prepare_dataset(chunk)
+
+
+def peak_rss():
+    '''
+    Peak resident memory of the current process, in bytes.
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _as_text_table(df1):
+    # Category columns as text: their categories differ between chunks
+    return pa.Table.from_pandas(
+        df1.astype({column: str for column in CATEGORY_COLUMNS + ENTITY_COLUMNS if column in df1}),
+        preserve_index=False)
+
+
+def spill_partitions(path, chunksize, sample=1000):
+    '''
+    Number of hash partitions of the deliverers spill, so that each holds
+    about one chunk of rows: the deliverers cube has at most one row per
+    order, and the number of orders is estimated from the size of the
+    file and of its first lines.
+
+    Input: path of the csv file, rows per chunk and lines sampled
+    Output: int, between 1 and MAX_SPILL_PARTITIONS
+    '''
+    with open(path, 'rb') as source:
+        source.readline()  # header
+        lines = list(itertools.islice(source, sample))
+    if not lines:
+        return 1
+    rows = os.path.getsize(path) / (sum(map(len, lines)) / len(lines))
+    return int(min(MAX_SPILL_PARTITIONS, max(1, math.ceil(rows / chunksize))))
+
+
+def _spill_part(deliverers, partitions):
+    # Partition of every row, from the ID only: the duplicates of a row,
+    # whatever their chunk, land in the same partition
+    ids = deliverers.Delivery_person_ID.astype(str)
+    return (pd.util.hash_pandas_object(ids, index=False).to_numpy() % partitions).astype(int)
+
+
+def stream_build(path=DATASET_PATH, chunksize=DEFAULT_CHUNKSIZE):
+    '''
+    Builds the dataset snapshot and the cube snapshots of a csv file that
+    may not fit in memory. Each cleaned chunk is appended to the snapshot
+    as Arrow record batches and its measures are merged into the measures
+    cube.
+
+    The deliverers cube has about one row per order (see utils.cubes), so
+    it is deduplicated out of core: the distinct deliverers of each chunk
+    are spilled to temporary Arrow files partitioned by a hash of the ID
+    (see spill_partitions), then each partition is deduplicated on its
+    own and appended to the snapshot. Memory stays bounded by the chunk
+    size, the measures cube and the largest partition, about one chunk of
+    rows unless the file needs more than MAX_SPILL_PARTITIONS of them.
+
+    The category columns are written as text (their categories differ
+    between chunks) and the rows are sorted per chunk only; read_snapshot
+    restores both when the snapshot is loaded.
+
+    Input: path of the csv file and number of rows per chunk
+    Output: dict with rows, chunks, seconds and peak_rss_bytes
+    '''
+    start = time.perf_counter()
+    source = source_stamp(path)
+    target = snapshot_path(path)
+    tmp_target = '{}.{}.tmp'.format(target, os.getpid())
+    deliverers_target = snapshot_path(path, 'deliverers')
+    tmp_deliverers = '{}.{}.tmp'.format(deliverers_target, os.getpid())
+    partitions = spill_partitions(path, chunksize)
+    spills = ['{}.{}.{}.tmp'.format(deliverers_target, os.getpid(), part) for part in range(partitions)]
+
+    writer = None
+    schema = None
+    spill_writers = {}
+    spill_schema = None
+    measures = None
+    rows = 0
+    chunks = 0
+    try:
+        try:
+            for df1 in iter_clean_chunks(path, chunksize):
+                table = _as_text_table(df1)
+                if writer is None:
+                    # int8 columns etc. are fixed by the first chunk; a later
+                    # chunk that doesn't fit fails the cast instead of overflowing
+                    schema = table.schema.with_metadata(snapshot_metadata(table.schema, source))
+                    writer = pa.ipc.new_file(tmp_target, schema)
+                writer.write_table(table.cast(schema))
+
+                chunk_cubes = build_cubes(df1)
+                measures = (chunk_cubes.measures if measures is None
+                            else merge_measures([measures, chunk_cubes.measures]))
+                # one Arrow table per chunk, sorted by partition and sliced
+                parts = _spill_part(chunk_cubes.deliverers, partitions)
+                order = np.argsort(parts, kind='stable')
+                table = _as_text_table(chunk_cubes.deliverers.iloc[order])
+                if spill_schema is None:
+                    spill_schema = table.schema
+                table = table.cast(spill_schema)
+                sizes = np.bincount(parts, minlength=partitions)
+                for part, first in zip(np.flatnonzero(sizes), (np.cumsum(sizes) - sizes)[sizes > 0]):
+                    if part not in spill_writers:
+                        spill_writers[part] = pa.ipc.new_file(spills[part], spill_schema)
+                    spill_writers[part].write_table(table.slice(first, sizes[part]))
+                rows += len(df1)
+                chunks += 1
+        finally:
+            for open_writer in [writer] + list(spill_writers.values()):
+                if open_writer is not None:
+                    open_writer.close()
+        if writer is None:
+            raise ValueError('{} has no rows'.format(path))
+        os.replace(tmp_target, target)
+
+        # One partition in memory at a time; read_snapshot sorts the rows
+        # by Order_Date when the cube is loaded
+        deliverers_schema = spill_schema.with_metadata(snapshot_metadata(spill_schema, source))
+        with pa.ipc.new_file(tmp_deliverers, deliverers_schema) as deliverers_writer:
+            for part in sorted(spill_writers):
+                distinct = feather.read_table(spills[part]).to_pandas().drop_duplicates()
+                deliverers_writer.write_table(pa.Table.from_pandas(distinct, preserve_index=False)
+                                                .cast(deliverers_schema))
+                os.remove(spills[part])
+        write_snapshot(measures, snapshot_path(path, 'measures'), source)
+        os.replace(tmp_deliverers, deliverers_target)
+    finally:
+        for spill in spills:
+            if os.path.exists(spill):
+                os.remove(spill)
+
+    return {'rows': rows,
+            'chunks': chunks,
+            'seconds': round(time.perf_counter() - start, 3),
+            'peak_rss_bytes': peak_rss()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Clean a csv file chunk by chunk into the dataset and cube snapshots.')
+    parser.add_argument('path', nargs='?', default=DATASET_PATH, help='csv file to clean')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help='rows per chunk (default: %(default)s)')
+    args = parser.parse_args()
+
+    if feather is None:
+        parser.error('pyarrow is required to write the snapshots')
+    report = stream_build(args.path, args.chunksize)
+    print('{rows} rows in {chunks} chunks, {seconds} s, peak RSS {mb:.1f} MB'.format(
+        mb=report['peak_rss_bytes'] / 2**20, **report))
@@ -0,0 +1,150 @@
+# ----------------- Libraries -----------------
+
+import pandas as pd
+
+from utils.cubes       import count_deliverers, rollup
+from utils.data_loader import decategorize
+from utils.downsample  import MAX_POINTS, time_buckets
+from utils.sketches    import DistinctSketches, distinct_count
+from utils.timeline    import ROLLING_WINDOWS, bucket_codes, fill_days, rolling_sum, week_labels
+
+# plotly and folium are imported by the functions drawing with them: they
+# are a large part of the start of a cold worker, and the maps are only
+# needed when their tab is drawn
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def _deliverers_by(deliverers, by):
+    # unique deliverers per group of the dates, exact or from the sketches
+    if isinstance(deliverers, DistinctSketches):
+        return distinct_count(deliverers, by(deliverers.keys.Order_Date))
+    return count_deliverers(deliverers, by(deliverers.Order_Date))
+
+
+def order_metric(cube, max_points=MAX_POINTS, windows=ROLLING_WINDOWS):
+    import plotly.express as px
+
+    aux = rollup(cube, 'Order_Date').reset_index()
+    # one bar per day, per week or per month, whichever fits in max_points
+    bucket, dates = time_buckets(aux.Order_Date, max_points)
+    if bucket != 'day':
+        aux = aux.groupby(dates.rename('Order_Date')).orders.sum().reset_index()
+    aux = aux.rename(columns={'orders':'Order_quantity'})
+    fig = px.bar(aux, x='Order_Date', y='Order_quantity',
+                 labels={'Order_Date': f'Order_Date (per {bucket})'} if bucket != 'day' else None)
+    if bucket == 'day':
+        # trend lines: average orders per day over the trailing windows
+        daily = fill_days(aux.set_index('Order_Date'))
+        for window in windows:
+            fig.add_scatter(x=daily.index, y=rolling_sum(daily.Order_quantity, window) / window,
+                            mode='lines', name=f'{window}-day average')
+    return fig
+
+
+def traffic_order_share(cube):
+    import plotly.express as px
+
+    aux = (rollup(cube, 'Road_traffic_density')
+              .reset_index()
+              .rename(columns={'orders':'Order_quantity'}))
+    aux = decategorize(aux)
+    aux = aux[aux['Road_traffic_density'] != 'NaN']
+    fig = px.pie(aux, 
+                 values='Order_quantity', 
+                 names='Road_traffic_density', 
+                 title='Order distribution per Road_traffic_density',
+                 color_discrete_sequence=px.colors.qualitative.Plotly)
+    return fig
+
+
+def traffic_order_city(cube):
+    import plotly.express as px
+
+    aux = (rollup(cube, ['Road_traffic_density', 'City'])
+              .reset_index()
+              .rename(columns={'orders':'volume_of_orders'}))
+    aux = decategorize(aux)
+    aux = aux[aux['City'] != 'NaN']
+    aux = aux[aux['Road_traffic_density'] != 'NaN']
+    fig = px.scatter(aux , 
+                     x="City", 
+                     y="Road_traffic_density", 
+                     size="volume_of_orders", 
+                     color='City',
+                     size_max=70,
+                     color_discrete_sequence=px.colors.qualitative.Plotly)
+    return fig
+
+
+def order_by_week(cube):
+    import plotly.express as px
+
+    aux = rollup(cube, 'Order_Date').reset_index()
+    aux = (aux.groupby(bucket_codes(aux.Order_Date, 'week'))
+              .orders.sum()
+              .rename_axis('Week')
+              .reset_index()
+              .rename(columns={'orders':'Order_quantity'}))
+    aux['Week'] = week_labels(aux.Week)
+    fig = px.line(aux, x='Week', y='Order_quantity')
+    return fig
+
+
+def Order_share_by_week(cube, deliverers):
+    import plotly.express as px
+
+    week = lambda dates: pd.Series(bucket_codes(dates, 'week'), index=dates.index, name='Week')
+    aux = rollup(cube, 'Order_Date').reset_index()
+    volume = aux.groupby(week(aux.Order_Date)).orders.sum()
+    quantity = _deliverers_by(deliverers, week)
+    aux = (pd.DataFrame({'volume_of_orders': volume, 'Deliverers_quantity': quantity})
+             .reset_index())
+    aux['Orders_per_deliverers'] = aux.volume_of_orders / aux.Deliverers_quantity
+    aux['Week'] = week_labels(aux.Week)
+    fig = px.line(aux, x='Week', y='Orders_per_deliverers')
+    return fig
+
+
+def rolling_order_share(cube, deliverers, windows=ROLLING_WINDOWS):
+    '''
+    Orders per deliverer over trailing windows of days: orders of the
+    window divided by the sum of the unique deliverers of each of its
+    days (orders per deliverer-day), both from cumulative sums.
+    '''
+    import plotly.express as px
+
+    aux = fill_days(pd.DataFrame({'orders': rollup(cube, 'Order_Date').orders,
+                                  'deliverers': _deliverers_by(deliverers, lambda dates: dates)})
+                      .fillna(0))
+    lines = pd.DataFrame({f'{window} days': pd.Series(rolling_sum(aux.orders, window))
+                                            / rolling_sum(aux.deliverers, window)
+                          for window in windows})
+    lines.index = aux.index
+    lines = lines.rename_axis('Order_Date').reset_index().melt('Order_Date', var_name='Window',
+                                                               value_name='Orders_per_deliverer')
+    fig = px.line(lines, x='Order_Date', y='Orders_per_deliverer', color='Window')
+    return fig
+
+
+def country_maps(df1):
+        import folium
+
+        cols = ['City', 'Road_traffic_density', 'Delivery_location_latitude', 'Delivery_location_longitude']
+        aux = (df1[cols].groupby(['City', 'Road_traffic_density'], observed=True)
+                        .median()
+                        .sort_index()
+                        .reset_index())
+        aux = aux[aux['City'] != 'NaN']
+        aux = aux[aux['Road_traffic_density'] != 'NaN']
+        m = folium.Map(location=[aux.Delivery_location_latitude.mean(),
+                                 aux.Delivery_location_longitude.mean()],
+                       zoom_start=7,
+                       control_scale=True)
+        for index, location_info in aux.iterrows():
+            folium.Marker(location=[location_info['Delivery_location_latitude'],
+                                    location_info['Delivery_location_longitude']],
+                          popup=location_info[['City', 'Road_traffic_density']]).add_to(m)
+        return m
@@ -0,0 +1,113 @@
+# ----------------- Libraries -----------------
+
+from typing import NamedTuple
+
+import numpy  as np
+import pandas as pd
+
+
+# One cube cell per combination of these columns
+CUBE_DIMENSIONS = ['Order_Date', 'Road_traffic_density', 'City',
+                   'Weatherconditions', 'Festival', 'Type_of_order']
+
+# Additive measures: they can be summed over any subset of cells
+MEASURES = ['orders', 'time_sum', 'time_sumsq',
+            'rating_count', 'rating_sum', 'rating_sumsq']
+
+
+class Cubes(NamedTuple):
+    '''
+    Pre-aggregated views of the cleaned dataset.
+
+        - measures: one row per cell of CUBE_DIMENSIONS with the MEASURES
+        - deliverers: distinct (CUBE_DIMENSIONS, Delivery_person_ID) rows,
+          used to count unique deliverers over any roll-up
+
+    The measures cube grows with the number of cells. The deliverers
+    cube does not shrink that way: a deliverer rarely delivers twice on
+    the same day, so even the distinct (day, deliverer) pairs are close
+    to one per order (30k pairs for 39k orders in train.csv). Exact
+    unique-deliverer counts therefore stay O(orders); the approximate
+    mode of utils.sketches is the one that does not depend on it.
+    '''
+    measures: pd.DataFrame
+    deliverers: pd.DataFrame
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def build_cubes(df1):
+    '''
+    Aggregates the cleaned dataset into cubes once, at load time. Both
+    cubes are sorted by Order_Date, like the dataset, so the filters of
+    utils.filters apply to them.
+
+    Input: cleaned Dataframe
+    Output: Cubes
+    '''
+    time = df1['Time_taken(min)'].astype(float)
+    rating = df1.Delivery_person_Ratings.astype(float)
+    aux = df1[CUBE_DIMENSIONS].assign(orders=1,
+                                       time_sum=time,
+                                       time_sumsq=time ** 2,
+                                       rating_count=rating.notna().astype(int),
+                                       rating_sum=rating.fillna(0),
+                                       rating_sumsq=rating.fillna(0) ** 2)
+    measures = (aux.groupby(CUBE_DIMENSIONS, observed=True)
+                   .sum()
+                   .reset_index()
+                   .sort_values('Order_Date', kind='mergesort', ignore_index=True))
+
+    deliverers = (df1[CUBE_DIMENSIONS + ['Delivery_person_ID']]
+                     .drop_duplicates()
+                     .sort_values('Order_Date', kind='mergesort', ignore_index=True))
+    return Cubes(measures, deliverers)
+
+
+def rollup(measures, by):
+    '''
+    Sums the measures over the given dimensions and derives mean and
+    standard deviation (ddof=1, as pandas) of time and rating from the
+    sums, so they are exact.
+
+    Input:
+        - measures: measures cube, usually filtered, or an object doing
+          the same roll-up elsewhere (see utils.sql_backend.SqlCube)
+        - by: dimension or list of dimensions to keep
+    Output: Dataframe with one row per group and the columns
+            orders, avg_time, std_time, avg_rating, std_rating
+    '''
+    if hasattr(measures, 'rollup'):
+        return measures.rollup(by)
+    # sort_index: pandas 1.5 returns observed category groups unsorted
+    aux = measures.groupby(by, observed=True)[MEASURES].sum().sort_index()
+    aux['avg_time'], aux['std_time'] = mean_std(aux.orders, aux.time_sum, aux.time_sumsq)
+    aux['avg_rating'], aux['std_rating'] = mean_std(aux.rating_count, aux.rating_sum, aux.rating_sumsq)
+    return aux.drop(columns=MEASURES[1:])
+
+
+def mean_std(count, total, total_sq):
+    '''
+    Mean and sample standard deviation from count, sum and sum of squares.
+    Groups with a single value get NaN std, like pandas.
+    '''
+    count = count.astype(float)
+    mean = total / count.where(count > 0)
+    var = (total_sq - total * mean) / (count - 1).where(count > 1)
+    return mean, np.sqrt(var.clip(lower=0))
+
+
+def count_deliverers(deliverers, by):
+    '''
+    Number of unique deliverers per group of the deliverers cube. Costs
+    O(rows of the filtered deliverers cube), about O(orders).
+
+    Input:
+        - deliverers: deliverers cube, usually filtered
+        - by: Series or column name(s) to group by
+    Output: Series
+    '''
+    return deliverers.groupby(by, observed=True).Delivery_person_ID.nunique().sort_index()
+
@@ -0,0 +1,594 @@
+# ----------------- Libraries -----------------
+
+import argparse
+import glob
+import json
+import os
+import threading
+
+import numpy  as np
+import pandas as pd
+
+from utils.cubes          import Cubes, build_cubes
+from utils.entities       import restaurant_ids
+from utils.geo            import haversine_array
+from utils.ingest         import PartitionedDataset
+from utils.profiling      import stage
+from utils.shared_dataset import SHARED_DIR, attach, current_version
+from utils.sketches       import build_sketches
+from utils.spatial        import build_spatial_index
+from utils.versions       import replace_version
+
+try:
+    import pyarrow        as pa
+    import pyarrow.feather as feather
+except ImportError:  # the snapshot is an optimisation, csv still works
+    pa = None
+    feather = None
+
+
+# A csv file, or a folder of csv partitions (see utils.ingest)
+DATASET_PATH = os.environ.get('CURRY_DATASET', 'dataset/train.csv')
+
+# Bump whenever clean_code changes the columns or dtypes it produces,
+# so snapshots written by older code are rebuilt instead of reused.
+SNAPSHOT_VERSION = '6'
+SNAPSHOT_METADATA_KEY = b'curry_company.snapshot_version'
+
+# Version of the csv file a snapshot was built from (see source_stamp)
+SOURCE_METADATA_KEY = b'curry_company.snapshot_source'
+
+# Low-cardinality text columns, stored as pandas categories
+CATEGORY_COLUMNS = ['Road_traffic_density', 'City', 'Festival', 'Type_of_order',
+                    'Type_of_vehicle', 'Weatherconditions']
+
+# Entity IDs, dictionary-encoded as categories too: their category codes
+# are the dense entity codes of utils.entities
+ENTITY_COLUMNS = ['Delivery_person_ID', 'Restaurant_ID']
+
+# Process-wide cache: {(path, mtime, size): {'dataset': cleaned dataframe,
+#                                            'cubes': Cubes built from it}}
+_cache = {}
+_cache_lock = threading.Lock()
+
+# Folders of partitions: {absolute path: PartitionedDataset}
+_partitioned = {}
+
+# Deliverer sketches, built on demand: {dataset_version: DistinctSketches}
+_sketches = {}
+
+# Grid indexes of the coordinates, built on demand: {dataset_version: SpatialIndex}
+_spatial = {}
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def _factorize(values, clean=None):
+    '''
+    Splits a column into integer codes and its distinct values, optionally
+    cleaned. Cleaning the distinct values instead of every row turns the
+    string work into O(unique values).
+
+    Input: Series and a function applied to the Index of distinct values
+    Output: (codes, cleaned distinct values)
+    '''
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    uniques = pd.Index(uniques)
+    if clean is not None:
+        uniques = clean(uniques)
+    return codes, uniques
+
+
+def _as_category(codes, uniques):
+    '''
+    Builds a Categorical from factorized codes. Categories are sorted, so
+    groupbys keep the same row order they had with plain strings.
+    '''
+    categories = uniques.dropna().unique().sort_values()
+    return pd.Categorical.from_codes(categories.get_indexer(uniques)[codes],
+                                     categories=categories)
+
+
+def _downcast(uniques, downcast):
+    '''
+    Parses the distinct values of a numeric text column into the smallest
+    dtype that holds them.
+    '''
+    return pd.to_numeric(pd.Series(uniques), downcast=downcast).to_numpy()
+
+
+def clean_code(df1):
+    '''
+    This function has the responsibility of clearing the dataframe.
+
+    Cleaning types:
+        1. Removing NaN data
+        2. Changing the type of the data column
+        3. Remove spaces from text variables
+        4. Formatting the given column
+        5. Clean up time column (remove text from numerical variable)
+
+    Every text column is factorized once and cleaned on its distinct
+    values. The 'NaN' rules are combined in a single mask and the valid
+    rows are copied once. Low-cardinality text columns and the deliverer
+    IDs become categories and the integer ones are downcast. The ratings
+    stay float64: in float32 their means drift from the csv's by one in
+    the second decimal.
+
+    Input: Dataframe
+    Output: Dataframe
+    '''
+    # read_csv parses a column as numbers when a file (a partition, a
+    # chunk) has no 'NaN ' in it: the text rules see those as text too
+    as_text = lambda uniques: uniques if uniques.dtype == object else uniques.astype(str)
+    strip = lambda uniques: as_text(uniques).str.strip()
+
+    # Remove space from string, one factorization per column
+    factorized = {
+        'Delivery_person_Age': _factorize(df1.Delivery_person_Age, strip),
+        'multiple_deliveries': _factorize(df1.multiple_deliveries, strip),
+        'Road_traffic_density': _factorize(df1.Road_traffic_density, strip),
+        'City': _factorize(df1.City, strip),
+        'Festival': _factorize(df1.Festival, strip),
+    }
+
+    # Removal of lines containing 'NaN', in a single mask
+    invalid = np.zeros(len(df1), dtype=bool)
+    for codes, uniques in factorized.values():
+        invalid |= np.asarray(uniques == 'NaN')[codes]
+    valid = ~invalid
+
+    def valid_codes(column, clean=None):
+        if column in factorized:
+            codes, uniques = factorized[column]
+        else:
+            codes, uniques = _factorize(df1[column], clean)
+        # Keep only the distinct values still used by the valid rows
+        codes = codes[valid]
+        used = np.flatnonzero(np.bincount(codes, minlength=len(uniques)))
+        remap = np.zeros(len(uniques), dtype=codes.dtype)
+        remap[used] = np.arange(len(used))
+        return remap[codes], uniques.take(used)
+
+    # Converting text/category/string to integers and floats
+    codes, uniques = valid_codes('Delivery_person_Age')
+    age = _downcast(uniques, 'integer')[codes]
+    codes, uniques = valid_codes('multiple_deliveries')
+    multiple_deliveries = _downcast(uniques, 'integer')[codes]
+    codes, uniques = valid_codes('Delivery_person_Ratings')
+    ratings = uniques.astype(float).to_numpy()[codes]
+    vehicle_condition = pd.to_numeric(df1.Vehicle_condition.to_numpy()[valid], downcast='integer')
+
+    # Converting text/category/string to Datetime
+    codes, uniques = valid_codes('Order_Date')
+    order_date = pd.to_datetime(uniques, format='%d-%m-%Y').take(codes)
+
+    # Remove text from numbers: '(min) 24' -> 24
+    codes, uniques = valid_codes('Time_taken(min)',
+                                 lambda uniques: uniques.str.replace('(min)', '', regex=False).str.strip())
+    time_taken = uniques.astype(int).take(codes)
+
+    # Categories, with the unnecessary text removed from the weather
+    categories = {column: _as_category(*valid_codes(column, strip))
+                  for column in CATEGORY_COLUMNS if column != 'Weatherconditions'}
+    categories['Weatherconditions'] = _as_category(
+        *valid_codes('Weatherconditions',
+                     lambda uniques: uniques.str.replace('conditions ', '', regex=False)))
+
+    cleaned = {
+        'ID': df1.ID[valid].str.strip().to_numpy(),
+        'Delivery_person_ID': _as_category(*valid_codes('Delivery_person_ID')),
+        'Delivery_person_Age': age,
+        'Delivery_person_Ratings': ratings,
+        'Order_Date': order_date.to_numpy(),
+        'Vehicle_condition': vehicle_condition,
+        'multiple_deliveries': multiple_deliveries,
+        'Time_taken(min)': time_taken.to_numpy(),
+        **categories,
+    }
+    columns = {column: cleaned[column] if column in cleaned else df1[column].to_numpy()[valid]
+               for column in df1.columns}
+    return pd.DataFrame(columns, index=df1.index[valid])
+
+
+def prepare_dataset(df):
+    '''
+    Cleans the raw dataframe and adds the columns derived from it, so
+    they are computed once at load time and stored in the snapshot.
+
+    The rows are sorted by Order_Date (stable), which the date filters of
+    utils.filters rely on.
+
+    Derived columns:
+        - distance: km between restaurant and delivery location
+        - Restaurant_ID: restaurant prefix of the deliverer ID (category)
+
+    Input: raw Dataframe
+    Output: Dataframe
+    '''
+    df1 = clean_code(df).sort_values('Order_Date', kind='mergesort', ignore_index=True)
+    df1['distance'] = haversine_array(df1.Restaurant_latitude, df1.Restaurant_longitude,
+                                      df1.Delivery_location_latitude, df1.Delivery_location_longitude)
+    df1['Restaurant_ID'] = restaurant_ids(df1.Delivery_person_ID)
+    return df1
+
+
+def decategorize(aux):
+    '''
+    Turns the category columns of a small aggregated dataframe back into
+    plain text. Plotly Express groups category columns by their category
+    list, which would add empty traces and reorder the colors.
+
+    Input: Dataframe
+    Output: Dataframe
+    '''
+    columns = aux.select_dtypes('category').columns
+    return aux.astype({column: object for column in columns})
+
+
+def file_key(path):
+    '''
+    Identifies one version of a dataset file on disk.
+
+    Input: path of the file
+    Output: tuple (absolute path, mtime in ns, size in bytes)
+    '''
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def source_stamp(path):
+    '''
+    Version of a csv file as stored in the snapshots built from it: its
+    mtime and size. Take it before reading the file, so a change made
+    while it is read leaves the snapshot stale.
+
+    Input: path of the csv file
+    Output: bytes
+    '''
+    return json.dumps(list(file_key(path)[1:])).encode()
+
+
+def snapshot_path(path, name=None):
+    '''
+    Location of a columnar snapshot of a csv file: same folder, same
+    name, '.feather' extension. Snapshots of the cubes add their name,
+    e.g. 'train.measures.feather'.
+    '''
+    root = os.path.splitext(path)[0]
+    if name is not None:
+        root = '{}.{}'.format(root, name)
+    return root + '.feather'
+
+
+def remove_snapshots(path):
+    '''
+    Deletes the snapshots of a csv file (dataset and cubes), e.g. when
+    the partition they were built from is removed.
+
+    Input: path of the csv file
+    Output: None
+    '''
+    for name in (None,) + Cubes._fields:
+        try:
+            os.remove(snapshot_path(path, name))
+        except FileNotFoundError:
+            pass
+    return None
+
+
+def snapshot_is_fresh(path, target=None):
+    '''
+    Checks if a snapshot of a csv file exists, was built from the csv as
+    it is now (same mtime and size, see source_stamp) and was written by
+    the current SNAPSHOT_VERSION. An exact match, not a newer snapshot: a
+    csv restored with an older mtime (cp -p, rsync -t, a backup) is
+    cleaned again.
+
+    Input: path of the csv file and of the snapshot (default: the dataset's)
+    Output: bool
+    '''
+    if target is None:
+        target = snapshot_path(path)
+    if feather is None or not os.path.exists(target):
+        return False
+    with pa.memory_map(target) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    return (metadata.get(SNAPSHOT_METADATA_KEY) == SNAPSHOT_VERSION.encode()
+            and metadata.get(SOURCE_METADATA_KEY) == source_stamp(path))
+
+
+def snapshot_metadata(schema, source):
+    '''
+    Schema metadata of a snapshot: the pandas metadata plus the
+    SNAPSHOT_VERSION that wrote it and the source_stamp of its csv.
+    '''
+    metadata = dict(schema.metadata or {})
+    metadata[SNAPSHOT_METADATA_KEY] = SNAPSHOT_VERSION.encode()
+    metadata[SOURCE_METADATA_KEY] = source
+    return metadata
+
+
+def write_snapshot(df1, target, source):
+    '''
+    Writes a cleaned dataframe as an uncompressed Feather (Arrow IPC) file,
+    so it can be memory-mapped when read back. The file is written next to
+    the target and renamed, so readers never see a half-written snapshot.
+
+    Input: cleaned dataframe, path of the snapshot and source_stamp of
+    the csv it was built from
+    Output: None
+    '''
+    table = pa.Table.from_pandas(df1, preserve_index=False)
+    table = table.replace_schema_metadata(snapshot_metadata(table.schema, source))
+
+    tmp_target = '{}.{}.tmp'.format(target, os.getpid())
+    feather.write_feather(table, tmp_target, compression='uncompressed')
+    os.replace(tmp_target, target)
+    return None
+
+
+def read_snapshot(target):
+    '''
+    Memory-maps a snapshot written by write_snapshot or streamed by
+    utils.chunked. Streamed snapshots store the category columns as text
+    and are sorted per chunk only, so both are restored here.
+
+    Input: path of the snapshot
+    Output: Dataframe
+    '''
+    df1 = feather.read_table(target, memory_map=True).to_pandas()
+    for column in CATEGORY_COLUMNS + ENTITY_COLUMNS:
+        if column in df1 and not isinstance(df1[column].dtype, pd.CategoricalDtype):
+            df1[column] = df1[column].astype('category')
+    if 'Order_Date' in df1 and not df1.Order_Date.is_monotonic_increasing:
+        df1 = df1.sort_values('Order_Date', kind='mergesort', ignore_index=True)
+    return df1
+
+
+def build_snapshot(path=DATASET_PATH):
+    '''
+    Cleans the csv file and writes its columnar snapshot.
+
+    Input: path of the csv file
+    Output: cleaned Dataframe
+    '''
+    source = source_stamp(path)
+    df1 = prepare_dataset(pd.read_csv(path))
+    write_snapshot(df1, snapshot_path(path), source)
+    return df1
+
+
+def read_dataset(path=DATASET_PATH):
+    '''
+    Returns the cleaned dataset, from the snapshot when it is fresh and
+    from the csv otherwise. A stale or missing snapshot is rebuilt; if it
+    can't be written (no pyarrow, read-only disk) the cleaned csv is used.
+
+    Input: path of the csv file
+    Output: cleaned Dataframe
+    '''
+    if snapshot_is_fresh(path):
+        with stage('read snapshot', 'load'):
+            return read_snapshot(snapshot_path(path))
+
+    source = source_stamp(path)
+    with stage('read csv', 'load'):
+        df = pd.read_csv(path)
+    with stage('clean_code', 'clean'):
+        df1 = prepare_dataset(df)
+    if feather is not None:
+        try:
+            with stage('write snapshot', 'load'):
+                write_snapshot(df1, snapshot_path(path), source)
+        except OSError:
+            pass
+    return df1
+
+
+def read_cubes(path):
+    '''
+    Reads the cube snapshots of a csv file.
+
+    Input: path of the csv file
+    Output: Cubes, or None when a snapshot is missing or stale
+    '''
+    targets = [snapshot_path(path, name) for name in Cubes._fields]
+    if not all(snapshot_is_fresh(path, target) for target in targets):
+        return None
+    with stage('read cube snapshots', 'load'):
+        return Cubes(*[read_snapshot(target) for target in targets])
+
+
+def _partitioned_entry(directory):
+    '''
+    Cache entry of a folder of partitions: new or changed files are
+    cleaned and appended to the in-memory dataset and cubes.
+    '''
+    directory = os.path.abspath(directory)
+    with _cache_lock:
+        partitioned = _partitioned.get(directory)
+        if partitioned is None:
+            partitioned = PartitionedDataset(directory, read_dataset, remove_partition=remove_snapshots)
+            _partitioned[directory] = partitioned
+    partitioned.refresh()
+    return {'dataset': partitioned.dataset, 'cubes': partitioned.cubes}
+
+
+def _shared_version(path):
+    '''
+    Version published by the loader process (see utils.shared_dataset)
+    when the path is the app's dataset and the shared mode is on.
+
+    Output: (absolute shared folder, version), or None
+    '''
+    if SHARED_DIR is None or feather is None or path != DATASET_PATH:
+        return None
+    version = current_version(SHARED_DIR)
+    if version is None:  # nothing published yet: load a private copy
+        return None
+    return (os.path.abspath(SHARED_DIR), version)
+
+
+def _cache_entry(path):
+    '''
+    Returns the cache entry of the current version of the file, reading
+    and cleaning it if needed. A new version replaces the cached one.
+    '''
+    key = _shared_version(path)
+    if key is not None:
+        with _cache_lock:
+            entry = _cache.get(key)
+            if entry is None:
+                with stage('attach shared dataset', 'load'):
+                    dataset, cubes = attach(SHARED_DIR, key[1])
+                entry = replace_version(_cache, key, {'dataset': dataset, 'cubes': cubes})
+        return entry
+
+    if os.path.isdir(path):
+        return _partitioned_entry(path)
+
+    key = file_key(path)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            entry = replace_version(_cache, key, {'dataset': read_dataset(path)})
+    return entry
+
+
+def _read_only(df1):
+    '''
+    Marks the column arrays of a cached dataframe as not writeable, so an
+    in-place write through a shallow copy (df.loc[...] = ..., fillna with
+    inplace=True) raises instead of changing the data of every session.
+    '''
+    for values in df1._mgr.arrays:
+        values = getattr(values, '_ndarray', values)
+        if isinstance(values, np.ndarray):
+            values.flags.writeable = False
+    return df1
+
+
+def dataset_version(path=DATASET_PATH):
+    '''
+    Identifies the version of the dataset the pages are showing, for
+    caches of results derived from it.
+
+    Input: path of the csv file or of a folder of csv files
+    Output: hashable
+    '''
+    shared = _shared_version(path)
+    if shared is not None:
+        return shared
+    if os.path.isdir(path):
+        directory = os.path.abspath(path)
+        _partitioned_entry(directory)
+        return (directory, _partitioned[directory].version)
+    return file_key(path)
+
+
+def load_dataset(path=DATASET_PATH):
+    '''
+    Reads and cleans the dataset once per process.
+
+    The cleaned dataframe is kept in a process-wide cache keyed on the
+    file's path, mtime and size, so Streamlit reruns triggered by widgets
+    only pay for filtering and aggregation. A new version of the file
+    replaces the cached one.
+
+    When the path is a folder, every csv file in it is a partition of the
+    dataset: new or changed partitions are picked up on the next call,
+    without cleaning the others again.
+
+    With CURRY_SHARED_DIR set, the dataset published there by the loader
+    process is memory-mapped instead, shared by every process of the
+    host, and a newly published version replaces it on the next call.
+
+    Input: path of the csv file or of a folder of csv files
+    Output: shallow copy of the cached dataframe. Pages may add columns
+            or filter it freely; its column arrays are read-only, so
+            writing values in place raises ValueError.
+    '''
+    return _read_only(_cache_entry(path)['dataset']).copy(deep=False)
+
+
+def load_cubes(path=DATASET_PATH):
+    '''
+    Aggregate cubes of the cached dataset, built once per dataset version.
+    Fresh cube snapshots (written by utils.chunked) are read instead of
+    aggregating the dataset again.
+
+    Input: path of the csv file or of a folder of csv files
+    Output: Cubes (see utils.cubes). Must not be modified in place.
+    '''
+    entry = _cache_entry(path)
+    with _cache_lock:
+        if 'cubes' not in entry:
+            cubes = read_cubes(path)
+            if cubes is None:
+                with stage('build cubes', 'aggregate'):
+                    cubes = build_cubes(entry['dataset'])
+            entry['cubes'] = cubes
+    return entry['cubes']
+
+
+def load_sketches(path=DATASET_PATH):
+    '''
+    HyperLogLog sketches of the deliverers per (day, traffic) of the
+    cached dataset, built on first use for each dataset version (only
+    the approximate distinct-count mode needs them).
+
+    Input: path of the csv file or of a folder of csv files
+    Output: DistinctSketches (see utils.sketches). Must not be modified in place.
+    '''
+    version = dataset_version(path)
+    with _cache_lock:
+        sketches = _sketches.get(version)
+    if sketches is None:
+        df1 = _cache_entry(path)['dataset']
+        with stage('build sketches', 'aggregate'):
+            sketches = build_sketches(df1)
+        with _cache_lock:
+            replace_version(_sketches, version, sketches)
+    return sketches
+
+
+def load_spatial_index(path=DATASET_PATH):
+    '''
+    Grid indexes of the restaurant and delivery locations of the cached
+    dataset, built on first use for each dataset version, for the radius
+    and nearest queries of utils.spatial.
+
+    Input: path of the csv file or of a folder of csv files
+    Output: SpatialIndex (see utils.spatial), with row positions in the
+            dataset of load_dataset. Must not be modified in place.
+    '''
+    version = dataset_version(path)
+    with _cache_lock:
+        index = _spatial.get(version)
+    if index is None:
+        df1 = _cache_entry(path)['dataset']
+        with stage('build spatial index', 'aggregate'):
+            index = build_spatial_index(df1)
+        with _cache_lock:
+            replace_version(_spatial, version, index)
+    return index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the columnar snapshot of the cleaned dataset.')
+    parser.add_argument('path', nargs='?', default=DATASET_PATH,
+                        help='csv file to clean, or a folder of csv partitions')
+    args = parser.parse_args()
+
+    if feather is None:
+        parser.error('pyarrow is required to write the snapshot')
+    if os.path.isdir(args.path):
+        paths = sorted(glob.glob(os.path.join(args.path, '*.csv')))
+    else:
+        paths = [args.path]
+    for path in paths:
+        df1 = build_snapshot(path)
+        print('{} rows written to {}'.format(len(df1), snapshot_path(path)))
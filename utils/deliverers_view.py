@@ -0,0 +1,95 @@
+# ----------------- Libraries -----------------
+
+from typing import NamedTuple
+
+import numpy  as np
+import pandas as pd
+
+from utils.cubes    import rollup
+from utils.entities import entity_stats
+
+
+# Deliverers per city in the fastest/slowest rankings, unless the page says otherwise
+TOP_K = 10
+
+
+class Ranking(NamedTuple):
+    '''
+    k fastest and k slowest deliverers of every city, by mean delivery time.
+    '''
+    fastest: pd.DataFrame
+    slowest: pd.DataFrame
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def _partial_top(values, k):
+    # Positions of the k smallest values, sorted by value then position.
+    # argpartition keeps an arbitrary subset of the values tied with the
+    # k-th one: every position up to that value is a candidate, and the
+    # lexsort keeps the first positions (the ID order) among the ties
+    if len(values) > k:
+        kth = values[np.argpartition(values, k - 1)[k - 1]]
+        candidates = np.flatnonzero(values <= kth)
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.lexsort((candidates, values[candidates]))][:k]
+
+
+def top_delivers(df1, k=TOP_K):
+    '''
+    Ranks the deliverers of every city present in the data by their mean
+    delivery time. The means come from the per-(city, deliverer) arrays
+    of utils.entities and both rankings are partial selections
+    (argpartition) within each city, so no full sort is needed and every
+    city gets up to k rows. Deliverers tied on the mean time, at the
+    boundary too, are ranked in ID order.
+
+    Input: cleaned Dataframe, usually filtered, and k
+    Output: Ranking with the columns City, Delivery_person_ID and
+            Time_taken(min), cities in category order, each city sorted
+            from the fastest (resp. slowest) deliverer
+    '''
+    # nonzero walks the (city, deliverer) cells in code order: each city is
+    # a contiguous block and ties keep the ID order (categories are sorted)
+    stats = entity_stats(df1, by='City')
+    cities, deliverers = np.nonzero(stats.orders)
+    values = stats.time_sum[cities, deliverers] / stats.orders[cities, deliverers]
+    times = pd.Series(values,
+                      index=pd.MultiIndex.from_arrays(
+                          [pd.Categorical.from_codes(cities, categories=df1.City.cat.categories),
+                           pd.Index(stats.ids[deliverers], dtype=object)],
+                          names=['City', 'Delivery_person_ID']),
+                      name='Time_taken(min)')
+    bounds = np.flatnonzero(np.diff(cities)) + 1
+    fastest, slowest = [], []
+    for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(values)]):
+        fastest.append(start + _partial_top(values[start:stop], k))
+        slowest.append(start + _partial_top(-values[start:stop], k))
+    if not fastest:
+        empty = times.reset_index()
+        return Ranking(empty, empty)
+    return Ranking(times.iloc[np.concatenate(fastest)].reset_index(),
+                   times.iloc[np.concatenate(slowest)].reset_index())
+
+
+def rating_per_deliverer(df1):
+    # Grouped on the deliverer codes instead of the ID strings. The
+    # groupby mean sums with compensation like the original page's, so the
+    # means rounded to 2 decimals match it (a plain bincount sum tips some
+    # exact .xx5 means to the other side)
+    codes = df1.Delivery_person_ID.cat.codes.to_numpy()
+    ratings = df1.Delivery_person_Ratings.groupby(codes).mean()
+    ratings = ratings[ratings.index >= 0]
+    aux = pd.DataFrame({'Delivery_person_ID': pd.Index(df1.Delivery_person_ID.cat.categories[ratings.index],
+                                                       dtype=object),
+                        'Delivery_person_Ratings': ratings.to_numpy()})
+    return round(aux, 2)
+
+
+def rating_by(cube, column):
+    aux = round(rollup(cube, column)[['avg_rating', 'std_rating']], 2)
+    aux.columns = ['Delivery_person_Ratings_mean', 'Delivery_person_Ratings_std']
+    return aux
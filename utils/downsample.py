@@ -0,0 +1,59 @@
+# ----------------- Libraries -----------------
+
+import math
+import os
+
+import pandas as pd
+
+from utils.timeline import bucket_codes, bucket_start
+
+
+# Most bars/points drawn by a time series chart; longer periods are
+# bucketed by week, then by month
+MAX_POINTS = int(os.environ.get('CURRY_MAX_POINTS', 120))
+
+# Rows of a large table sent to the browser at once
+PAGE_SIZE = 50
+
+# Buckets tried in order (see utils.timeline)
+TIME_BUCKETS = ['day', 'week', 'month']
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def time_buckets(dates, max_points=MAX_POINTS):
+    '''
+    Finest of day, week (Sunday to Saturday, as the %U weeks) and month
+    giving at most max_points buckets over the period of the dates.
+
+    Input: Series of dates and the maximum number of buckets
+    Output: (name of the bucket, Series with the first day of the bucket
+            of every date)
+    '''
+    if len(dates) == 0:
+        return 'day', dates
+    for name in TIME_BUCKETS:
+        codes = bucket_codes(dates, name)
+        if codes.max() - codes.min() + 1 <= max_points:
+            break
+    if name == 'day':
+        return name, dates
+    return name, pd.Series(bucket_start(codes, name), index=dates.index, name=dates.name)
+
+
+def page_count(df, page_size=PAGE_SIZE):
+    return max(1, math.ceil(len(df) / page_size))
+
+
+def paginate(df, page, page_size=PAGE_SIZE):
+    '''
+    Rows of one page of a table, so only page_size rows are sent to the
+    browser.
+
+    Input: Dataframe, page number (from 1) and rows per page
+    Output: Dataframe (view)
+    '''
+    start = (min(max(page, 1), page_count(df, page_size)) - 1) * page_size
+    return df.iloc[start:start + page_size]
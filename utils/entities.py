@@ -0,0 +1,87 @@
+# ----------------- Libraries -----------------
+
+from typing import NamedTuple
+
+import numpy  as np
+import pandas as pd
+
+
+# Deliverer IDs embed their restaurant: 'INDORES13DEL02' -> 'INDORES13'
+RESTAURANT_SEPARATOR = 'DEL'
+
+
+class EntityStats(NamedTuple):
+    '''
+    Sums per entity (deliverer or restaurant), in arrays indexed by the
+    category code of the entity: the stats of ids[i] are orders[i],
+    time_sum[i]... With a grouping column, the arrays have one row per
+    category of that column first: orders[group, i].
+    '''
+    ids: pd.Index
+    orders: np.ndarray
+    time_sum: np.ndarray
+    rating_count: np.ndarray
+    rating_sum: np.ndarray
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def restaurant_ids(deliverer_ids):
+    '''
+    Restaurant of every order, from the prefix of its deliverer ID. The
+    prefixes are computed on the distinct IDs (the categories) only and
+    mapped to the rows through the category codes.
+
+    Input: categorical Series of Delivery_person_ID
+    Output: Categorical with sorted categories
+    '''
+    prefixes = (pd.Index(deliverer_ids.cat.categories, dtype=object)
+                  .str.strip()
+                  .str.rsplit(RESTAURANT_SEPARATOR, n=1)
+                  .str[0])
+    restaurants = prefixes.unique().sort_values()
+    codes = deliverer_ids.cat.codes.to_numpy()
+    per_id = restaurants.get_indexer(prefixes)
+    return pd.Categorical.from_codes(np.where(codes >= 0, per_id[codes], -1), categories=restaurants)
+
+
+def _codes(column):
+    # Dense integer codes of a column, dictionary-encoded at load time
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype('category')
+    return column.cat.codes.to_numpy().astype(np.int64), column.cat.categories
+
+
+def entity_stats(df1, column='Delivery_person_ID', by=None):
+    '''
+    Order counts, delivery time sums and rating sums of every entity,
+    with one np.bincount over the integer codes per measure: no string
+    is hashed, whatever the number of entities. Entities of the
+    categories absent from the rows get zeros.
+
+    Input: cleaned Dataframe (usually filtered), the entity column and
+    optionally a category column to split the stats by (e.g. City)
+    Output: EntityStats
+    '''
+    codes, ids = _codes(df1[column])
+    shape = (len(ids),)
+    valid = codes >= 0
+    if by is not None:
+        group_codes, groups = _codes(df1[by])
+        valid &= group_codes >= 0
+        codes = group_codes * len(ids) + codes
+        shape = (len(groups), len(ids))
+
+    codes = codes[valid]
+    time_taken = df1['Time_taken(min)'].to_numpy(dtype=float)[valid]
+    rating = df1.Delivery_person_Ratings.to_numpy(dtype=float)[valid]
+    rated = ~np.isnan(rating)
+    size = int(np.prod(shape))
+    return EntityStats(ids=ids,
+                       orders=np.bincount(codes, minlength=size).reshape(shape),
+                       time_sum=np.bincount(codes, weights=time_taken, minlength=size).reshape(shape),
+                       rating_count=np.bincount(codes[rated], minlength=size).reshape(shape),
+                       rating_sum=np.bincount(codes[rated], weights=rating[rated],
+                                              minlength=size).reshape(shape))
@@ -0,0 +1,143 @@
+# ----------------- Libraries -----------------
+
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.figure_cache import sizeof
+from utils.profiling    import current_profiler, record_payload, stage
+
+
+# Threads shared by every session of the process. The sections only read
+# the dataset and the cubes, and the pandas/numpy kernels release the GIL,
+# so threads overlap without copying the data into other processes.
+# CURRY_WORKERS=0 computes each section in the script thread when the
+# page asks for it.
+MAX_WORKERS = int(os.environ.get('CURRY_WORKERS', min(4, os.cpu_count() or 1)))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Where the sections of the last run of a session are kept
+SESSION_KEY = 'page_sections'
+
+_MISSING = object()
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def get_pool():
+    '''
+    Process-wide thread pool, created on first use.
+
+    Output: ThreadPoolExecutor, or None when MAX_WORKERS is 0
+    '''
+    global _pool
+    if MAX_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='curry-section')
+        return _pool
+
+
+def _profiled(name, function, profiler):
+    # Worker threads have no rerun of their own: time the section in the
+    # profiler of the page that submitted it
+    def run():
+        if profiler is None:
+            return function()
+        with profiler.stage(name, 'aggregate'):
+            return function()
+    return run
+
+
+class Sections:
+    '''
+    Independent sections of a page computed in the background.
+
+    Every section is submitted at once, in page order, so the first
+    visible chart is computed first while the ones of the other tabs
+    run on the other workers. The page renders each result in the script
+    thread (Streamlit calls are not thread-safe) as soon as it is ready.
+
+    With a cache (see utils.figure_cache), sections already computed for
+    the same key are not submitted and new results are stored in it.
+    '''
+
+    def __init__(self, functions, pool=None, cache=None, key=()):
+        self.functions = functions
+        self.pool = pool if pool is not None else get_pool()
+        self.cache = cache
+        self.key = key
+        self.futures = {}
+        self.results = {}
+        self.sizes = {}
+        if cache is not None:
+            for name in functions:
+                result = cache.get((name,) + key, _MISSING)
+                if result is not _MISSING:
+                    self.results[name] = result
+                    self.sizes[name] = cache.size((name,) + key)
+        if self.pool is not None:
+            profiler = current_profiler()
+            self.futures = {name: self.pool.submit(_profiled(name, function, profiler))
+                            for name, function in functions.items() if name not in self.results}
+
+    def result(self, name):
+        '''
+        Waits for a section (or computes it here without a pool) and
+        records the size of its payload (see utils.profiling.record_payload).
+
+        Input: section name
+        Output: result of the section function
+        '''
+        if name not in self.results:
+            if name in self.futures and not self.futures[name].cancelled():
+                with stage(name, 'wait'):
+                    self.results[name] = self.futures[name].result()
+            else:
+                with stage(name, 'aggregate'):
+                    self.results[name] = self.functions[name]()
+        if self.sizes.get(name) is None:
+            self.sizes[name] = sizeof(self.results[name])
+            if self.cache is not None:
+                self.cache.put((name,) + self.key, self.results[name], self.sizes[name])
+        record_payload(name, self.sizes[name])
+        return self.results[name]
+
+    def cancel(self):
+        '''
+        Drops the sections not started yet: run_sections calls it on the
+        sections of the previous run of the session, which a rerun or a
+        page change left behind.
+        '''
+        for future in self.futures.values():
+            future.cancel()
+
+
+def run_sections(functions, pool=None, cache=None, key=(), session_state=None):
+    '''
+    Starts computing the sections of a page.
+
+    With the session state, the sections the previous run of the session
+    has not started yet are cancelled first: a rerun aborted by a widget
+    change would otherwise keep the workers busy with charts nobody waits
+    for, ahead of the ones of the new run.
+
+    Input: dict section name -> function without arguments, optionally a
+    FigureCache, the key of the filter state (see filter_key) and
+    st.session_state
+    Output: Sections
+    '''
+    if session_state is not None:
+        previous = session_state.get(SESSION_KEY)
+        if previous is not None:
+            previous.cancel()
+    sections = Sections(functions, pool, cache, key)
+    if session_state is not None:
+        session_state[SESSION_KEY] = sections
+    return sections
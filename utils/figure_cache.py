@@ -0,0 +1,139 @@
+# ----------------- Libraries -----------------
+
+import datetime
+import os
+import sys
+
+from collections import OrderedDict
+
+import pandas as pd
+
+from utils.profiling import count
+
+
+# Memory budget of the figure cache of each session, in MB
+FIGURE_CACHE_MB = float(os.environ.get('CURRY_FIGURE_CACHE_MB', 64))
+SESSION_KEY = 'figure_cache'
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def sizeof(value):
+    '''
+    Approximate memory held by a cached result, in bytes: deep size of
+    the dataframes, size of the JSON spec of the Plotly figures (what
+    Streamlit sends), sum of the fields of named tuples.
+    '''
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, tuple):
+        return sum(sizeof(item) for item in value) + sys.getsizeof(value)
+    if hasattr(value, 'to_plotly_json'):
+        return len(value.to_json(validate=False))
+    return sys.getsizeof(value)
+
+
+def filter_key(date_slider, traffic_options=None, weather_options=None, *options):
+    '''
+    Normalized filter state: the same selection in another order (or
+    with a datetime instead of a date) gives the same key.
+
+    Output: tuple
+    '''
+    if isinstance(date_slider, datetime.datetime):
+        date_slider = date_slider.date()
+    traffic = None if traffic_options is None else tuple(sorted(traffic_options))
+    weather = None if weather_options is None else tuple(sorted(weather_options))
+    return (date_slider, traffic, weather) + options
+
+
+class FigureCache:
+    '''
+    Results of the page sections (figures, tables, summaries) of one
+    session, keyed on (section, filters) for one dataset version.
+
+    Least recently used results are evicted once the cache holds more
+    than budget bytes; a new dataset version empties it. Hits, misses
+    and evictions go to the counters of the current rerun (see
+    utils.profiling.count) and to the totals of the cache.
+    '''
+
+    def __init__(self, budget=FIGURE_CACHE_MB * 2**20):
+        self.budget = budget
+        self.version = None
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def use_version(self, version):
+        '''
+        Drops every cached result when the dataset version changed.
+        '''
+        if version != self.version:
+            self.entries.clear()
+            self.bytes = 0
+            self.version = version
+
+    def get(self, key, default=None):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            count('figure_cache_hits')
+            return self.entries[key][0]
+        self.misses += 1
+        count('figure_cache_misses')
+        return default
+
+    def size(self, key):
+        '''
+        Size recorded for a cached result, None if it is not cached.
+        '''
+        entry = self.entries.get(key)
+        return None if entry is None else entry[1]
+
+    def put(self, key, value, size=None):
+        if size is None:
+            size = sizeof(value)
+        if size > self.budget:
+            return value
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        self.entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.budget:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+            count('figure_cache_evictions')
+        return value
+
+    def stats(self):
+        '''
+        Totals of the cache since the session started, for the timings
+        panel (see utils.profiling.render_timings).
+        '''
+        return {'entries': len(self.entries),
+                'bytes': self.bytes,
+                'budget': int(self.budget),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions}
+
+
+def session_cache(session_state, version):
+    '''
+    Figure cache of the current session, stored in its session state and
+    emptied when the dataset version changed.
+
+    Input: st.session_state (or any dict-like) and the dataset version
+    Output: FigureCache
+    '''
+    cache = session_state.get(SESSION_KEY)
+    if cache is None:
+        cache = session_state[SESSION_KEY] = FigureCache()
+    cache.use_version(version)
+    return cache
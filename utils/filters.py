@@ -0,0 +1,61 @@
+# ----------------- Libraries -----------------
+
+import datetime
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def date_bounds(df1):
+    '''
+    Limits for the cut-off date slider. The frame must be sorted by
+    Order_Date, so both ends are read in O(1).
+
+    Input: Dataframe sorted by Order_Date
+    Output: (first order date, day after the last order date) as datetime,
+            so the upper limit keeps every order
+    '''
+    first = df1.Order_Date.iloc[0].to_pydatetime()
+    last = df1.Order_Date.iloc[-1].to_pydatetime()
+    return first, last + datetime.timedelta(days=1)
+
+
+def cut_off(df1, date_slider):
+    '''
+    Rows before the cut-off date. The sorted Order_Date column works as
+    the date -> row offset index: a binary search finds the offset and
+    the rows are sliced without copying.
+
+    Input: Dataframe sorted by Order_Date and the cut-off date
+    Output: Dataframe (view)
+    '''
+    stop = df1.Order_Date.searchsorted(date_slider, side='left')
+    return df1.iloc[:stop]
+
+
+def apply_filters(df1, date_slider, traffic_options=None, weather_options=None):
+    '''
+    Applies the sidebar filters of the pages: a cut-off slice first, then
+    the categorical filters combined in a single mask applied once.
+
+    Works on the cleaned dataset and on the cubes, all sorted by Order_Date.
+
+    Input:
+        - df1: Dataframe sorted by Order_Date
+        - date_slider: cut-off date, only rows before it are kept
+        - traffic_options, weather_options: selected values, None keeps all
+    Output: Dataframe
+    '''
+    df1 = cut_off(df1, date_slider)
+
+    rows = None
+    for column, options in [('Road_traffic_density', traffic_options),
+                            ('Weatherconditions', weather_options)]:
+        if options is None:
+            continue
+        selected = df1[column].isin(options).to_numpy()
+        rows = selected if rows is None else rows & selected
+    if rows is None or rows.all():
+        return df1
+    return df1.loc[rows, :]
@@ -0,0 +1,45 @@
+# ----------------- Libraries -----------------
+
+import numpy as np
+
+
+# Same mean earth radius used by the haversine package
+AVG_EARTH_RADIUS_KM = 6371.0088
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def haversine_array(lat1, lng1, lat2, lng2):
+    '''
+    Vectorized haversine: great-circle distance between every pair of
+    points at once, equal to haversine.haversine() row by row.
+
+    Input: arrays (or Series) of latitudes and longitudes in degrees
+    Output: array of distances in km
+    '''
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(x, dtype=float))
+                              for x in (lat1, lng1, lat2, lng2))
+    d = (np.sin((lat2 - lat1) * 0.5) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) * 0.5) ** 2)
+    return 2 * AVG_EARTH_RADIUS_KM * np.arcsin(np.sqrt(d))
+
+
+def clean_coordinates(lat, lng):
+    '''
+    Repairs the coordinates of this dataset, where every location is in
+    India (north of the equator, east of Greenwich):
+        - a negative latitude or longitude is a flipped sign: made positive
+        - points within 1 degree of (0, 0) are a placeholder for a missing
+          location: set to NaN
+
+    Input: arrays (or Series) of latitudes and longitudes in degrees
+    Output: (latitudes, longitudes) as float arrays
+    '''
+    lat = np.abs(np.asarray(lat, dtype=float))
+    lng = np.abs(np.asarray(lng, dtype=float))
+    missing = (lat < 1) & (lng < 1)
+    lat[missing] = np.nan
+    lng[missing] = np.nan
+    return lat, lng
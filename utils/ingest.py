@@ -0,0 +1,170 @@
+# ----------------- Libraries -----------------
+
+import glob
+import os
+import threading
+import time
+
+import pandas as pd
+
+from pandas.api.types import union_categoricals
+
+from utils.cubes import CUBE_DIMENSIONS, MEASURES, Cubes, build_cubes
+
+
+# Minimum time between two scans of the partition folder
+REFRESH_SECONDS = 2.0
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def concat_frames(frames):
+    '''
+    Concatenates cleaned dataframes whose category columns may have
+    different categories (pd.concat would turn them into object columns),
+    keeping the result sorted by Order_Date.
+
+    Input: list of Dataframes with the same columns, each sorted by Order_Date
+    Output: Dataframe
+    '''
+    frames = [frame for frame in frames if len(frame)] or frames[:1]
+    if len(frames) == 1:
+        return frames[0]
+
+    columns = {}
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            columns[column] = union_categoricals([frame[column] for frame in frames],
+                                                 sort_categories=True)
+        else:
+            columns[column] = pd.concat([frame[column] for frame in frames],
+                                        ignore_index=True)
+    df1 = pd.DataFrame(columns)
+
+    # Daily extracts arrive in date order: only sort when they overlap
+    in_order = all(previous.Order_Date.iloc[-1] <= following.Order_Date.iloc[0]
+                   for previous, following in zip(frames, frames[1:]))
+    if not in_order:
+        df1 = df1.sort_values('Order_Date', kind='mergesort', ignore_index=True)
+    return df1
+
+
+def merge_measures(measures):
+    '''
+    Combines the measures cubes of several partitions: cells present in
+    more than one partition (same day in two files) are summed. Costs
+    O(cells), not O(orders).
+
+    Input: list of measures Dataframes
+    Output: Dataframe
+    '''
+    if len(measures) == 1:
+        return measures[0]
+    return (concat_frames(measures).groupby(CUBE_DIMENSIONS, observed=True)[MEASURES]
+                                   .sum()
+                                   .reset_index()
+                                   .sort_values('Order_Date', kind='mergesort', ignore_index=True))
+
+
+def merge_cubes(cubes):
+    '''
+    Combines the cubes of several partitions. The measures are summed
+    (see merge_measures) and the distinct deliverers deduplicated; the
+    deliverers tables have about one row per order (see utils.cubes), so
+    that part costs O(orders).
+
+    Input: list of Cubes
+    Output: Cubes
+    '''
+    if len(cubes) == 1:
+        return cubes[0]
+    deliverers = (concat_frames([cube.deliverers for cube in cubes])
+                     .drop_duplicates(ignore_index=True))
+    return Cubes(merge_measures([cube.measures for cube in cubes]), deliverers)
+
+
+class PartitionedDataset:
+    '''
+    Cleaned dataset assembled from a folder of csv partitions, e.g. one
+    daily order extract per file.
+
+    refresh() only cleans new or changed partitions (identified by path,
+    mtime and size). New partitions are appended to the assembled dataset
+    and merged into its cubes; unchanged partitions are never reprocessed.
+    A changed or removed partition triggers a re-assembly from the cleaned
+    partitions already in memory, still without re-cleaning.
+    '''
+
+    def __init__(self, directory, read_partition, pattern='*.csv', remove_partition=None):
+        '''
+        Input:
+            - directory: folder with the partitions
+            - read_partition: function path -> cleaned Dataframe
+            - pattern: glob of the partition files inside the folder
+            - remove_partition: function called with the path of every
+              partition that disappeared, e.g. to delete its snapshots
+        '''
+        self.directory = directory
+        self.read_partition = read_partition
+        self.remove_partition = remove_partition
+        self.pattern = pattern
+        self.partitions = {}   # path -> (file_key, cleaned frame, cubes)
+        self.dataset = None
+        self.cubes = None
+        self.version = 0
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        '''
+        Picks up new, changed and removed partitions. The folder is scanned
+        at most once every REFRESH_SECONDS unless force is True.
+
+        Output: True if the dataset changed
+        '''
+        with self._lock:
+            now = time.monotonic()
+            if (not force and self._checked_at is not None
+                    and now - self._checked_at < REFRESH_SECONDS):
+                return False
+            self._checked_at = now
+            return self._refresh()
+
+    def _refresh(self):
+        paths = sorted(glob.glob(os.path.join(self.directory, self.pattern)))
+        if not paths:
+            raise FileNotFoundError('no partition matches {}'.format(
+                os.path.join(self.directory, self.pattern)))
+
+        keys = {}
+        for path in paths:
+            stat = os.stat(path)
+            keys[path] = (stat.st_mtime_ns, stat.st_size)
+        removed = [path for path in self.partitions if path not in keys]
+        changed = [path for path in paths
+                   if path in self.partitions and self.partitions[path][0] != keys[path]]
+        new = [path for path in paths if path not in self.partitions]
+        if not (removed or changed or new):
+            return False
+
+        for path in removed:
+            del self.partitions[path]
+            if self.remove_partition is not None:
+                self.remove_partition(path)
+        for path in changed + new:
+            df1 = self.read_partition(path)
+            self.partitions[path] = (keys[path], df1, build_cubes(df1))
+
+        if self.dataset is not None and not (removed or changed):
+            # Append only: the in-memory dataset and cubes absorb the new files
+            added = [self.partitions[path] for path in new]
+            self.dataset = concat_frames([self.dataset] + [df1 for _, df1, _ in added])
+            self.cubes = merge_cubes([self.cubes] + [cubes for _, _, cubes in added])
+        else:
+            partitions = [self.partitions[path] for path in paths]
+            self.dataset = concat_frames([df1 for _, df1, _ in partitions])
+            self.cubes = merge_cubes([cubes for _, _, cubes in partitions])
+        self.version += 1
+        return True
@@ -0,0 +1,145 @@
+# ----------------- Libraries -----------------
+
+import threading
+
+from collections import OrderedDict
+
+import numpy  as np
+import pandas as pd
+
+from utils.geo       import clean_coordinates
+from utils.profiling import count
+
+# folium is imported when a map is built, not when a page starts
+
+
+# Upper bound of grid cells drawn on the density map
+MAX_CELLS = 2000
+# Smallest grid cell, in degrees (~1 km)
+MIN_CELL_DEGREES = 0.01
+# Rendered maps kept per process
+MAP_CACHE_SIZE = 32
+
+_map_cache = OrderedDict()
+_map_cache_lock = threading.Lock()
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def bin_locations(df1, lat_col='Delivery_location_latitude',
+                  lng_col='Delivery_location_longitude', max_cells=MAX_CELLS):
+    '''
+    Server-side grid binning of delivery locations. The cell size starts
+    from the extent of the points (never below MIN_CELL_DEGREES) and
+    doubles until at most max_cells cells remain,
+    so the map payload no longer grows with the number of orders.
+    Coordinates are repaired with utils.geo.clean_coordinates: points at
+    (0, 0), a placeholder for missing coordinates in this dataset, are
+    left out.
+
+    Input: Dataframe with the coordinate columns
+    Output: Dataframe with one row per cell: lat, lng (centroid of the
+            points in the cell), orders
+    '''
+    lat, lng = clean_coordinates(df1[lat_col], df1[lng_col])
+    valid = np.isfinite(lat) & np.isfinite(lng)
+    lat, lng = lat[valid], lng[valid]
+    if not len(lat):
+        return pd.DataFrame({'lat': [], 'lng': [], 'orders': []})
+
+    # First guess from the extent of the points, usually final
+    cell = max(MIN_CELL_DEGREES, np.sqrt(np.ptp(lat) * np.ptp(lng) / max_cells))
+    while True:
+        rows = np.floor((lat + 90) / cell).astype(np.int64)
+        cols = np.floor((lng + 180) / cell).astype(np.int64)
+        keys = rows * (int(360 / cell) + 1) + cols
+        uniques, inverse = np.unique(keys, return_inverse=True)
+        if len(uniques) <= max_cells:
+            break
+        cell *= 2
+
+    orders = np.bincount(inverse)
+    return pd.DataFrame({'lat': np.bincount(inverse, weights=lat) / orders,
+                         'lng': np.bincount(inverse, weights=lng) / orders,
+                         'orders': orders})
+
+
+def density_map(df1):
+    '''
+    Heat map of every delivery location, drawn from the binned cells.
+
+    Input: Dataframe
+    Output: folium.Map
+    '''
+    import folium
+    from folium.plugins import HeatMap
+
+    cells = bin_locations(df1)
+    if cells.empty:
+        return folium.Map(zoom_start=2, control_scale=True)
+    m = folium.Map(location=[np.average(cells.lat, weights=cells.orders),
+                             np.average(cells.lng, weights=cells.orders)],
+                   zoom_start=5,
+                   control_scale=True)
+    HeatMap(cells[['lat', 'lng', 'orders']].to_numpy().tolist(),
+            radius=12,
+            max_zoom=10).add_to(m)
+    return m
+
+
+def radius_map(orders, lat, lng, radius_km, restaurants=None):
+    '''
+    Orders delivered around a location: the circle searched, the binned
+    delivery locations as a heat map and, if given, markers on the
+    nearest restaurants.
+
+    Input: Dataframe of the orders (see utils.spatial.orders_within),
+    the center, the radius and the table of nearest_restaurants
+    Output: folium.Map
+    '''
+    import folium
+    from folium.plugins import HeatMap
+
+    m = folium.Map(location=[lat, lng], zoom_start=12, control_scale=True)
+    folium.Circle([lat, lng], radius=radius_km * 1000, fill=False).add_to(m)
+    cells = bin_locations(orders)
+    if not cells.empty:
+        HeatMap(cells[['lat', 'lng', 'orders']].to_numpy().tolist(),
+                radius=12,
+                max_zoom=14).add_to(m)
+    if restaurants is not None:
+        for row in restaurants.itertuples(index=False):
+            folium.Marker([row.latitude, row.longitude],
+                          popup='{} ({}) - {} km'.format(row.Restaurant, row.City, row.distance_km),
+                          icon=folium.Icon(color='red', icon='cutlery')).add_to(m)
+    return m
+
+
+def cached_map_html(key, build_map):
+    '''
+    HTML of a folium map, cached per process and keyed on the dataset
+    version and the filter state, so reruns with the same filters skip
+    building and serializing the map. Least recently used maps are
+    dropped after MAP_CACHE_SIZE entries.
+
+    Input:
+        - key: hashable, e.g. (mode, dataset version, filters)
+        - build_map: function without arguments returning a folium.Map
+    Output: str
+    '''
+    with _map_cache_lock:
+        if key in _map_cache:
+            _map_cache.move_to_end(key)
+            count('map_cache_hits')
+            return _map_cache[key]
+    count('map_cache_misses')
+    import folium
+    # Same page streamlit_folium.folium_static renders for a Map
+    html = folium.Figure().add_child(build_map()).render()
+    with _map_cache_lock:
+        _map_cache[key] = html
+        while len(_map_cache) > MAP_CACHE_SIZE:
+            _map_cache.popitem(last=False)
+    return html
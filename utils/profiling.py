@@ -0,0 +1,265 @@
+# ----------------- Libraries -----------------
+
+import json
+import logging
+import os
+import resource
+import threading
+import time
+import uuid
+
+from collections import defaultdict, deque
+from contextlib  import contextmanager
+
+
+# Reruns kept per (page, stage) for the p50/p95 of the sidebar panel
+HISTORY_SIZE = 500
+
+# Payload of a single chart or table sent to the browser above which it
+# is flagged (logged as a warning and marked in the panel), in KB
+PAYLOAD_BUDGET_KB = float(os.environ.get('CURRY_PAYLOAD_BUDGET_KB', 256))
+
+# One JSON line per rerun, e.g. {"page": ..., "run": ..., "stages": [...]}
+logger = logging.getLogger('curry_company.timing')
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_history = defaultdict(lambda: deque(maxlen=HISTORY_SIZE))
+_history_lock = threading.Lock()
+
+# Streamlit runs every session's script in its own thread
+_local = threading.local()
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def current_rss():
+    '''
+    Resident memory of the process in bytes (Linux /proc; elsewhere the
+    peak RSS is the best available approximation).
+    '''
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RunProfiler:
+    '''
+    Wall time and memory delta of every stage of one page rerun.
+
+    Stage kinds: load, clean, filter, aggregate, render, plus milestones
+    (seconds since the start of the rerun, e.g. first paint). Memory
+    deltas are RSS deltas of the whole process, so concurrent sessions
+    blur them.
+    '''
+
+    def __init__(self, page, started=None):
+        self.page = page
+        self.run = uuid.uuid4().hex[:8]
+        self.started = time.perf_counter()
+        self.stages = []
+        if started is not None:
+            # imports of the page script, before the profiler existed
+            self.started = started
+            self.stages.append({'stage': 'imports',
+                                'kind': 'load',
+                                'seconds': time.perf_counter() - started,
+                                'rss_delta_bytes': 0})
+        self.counters = defaultdict(int)
+        self.payloads = {}
+
+    @contextmanager
+    def stage(self, name, kind):
+        rss = current_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append({'stage': name,
+                                'kind': kind,
+                                'seconds': time.perf_counter() - start,
+                                'rss_delta_bytes': current_rss() - rss})
+
+    def finish(self):
+        total = time.perf_counter() - self.started
+        with _history_lock:
+            for record in self.stages:
+                _history[(self.page, record['stage'])].append(record['seconds'])
+            _history[(self.page, 'total')].append(total)
+        logger.info(json.dumps({'event': 'page_run',
+                                'page': self.page,
+                                'run': self.run,
+                                'seconds': round(total, 6),
+                                'stages': [dict(record, seconds=round(record['seconds'], 6))
+                                           for record in self.stages],
+                                'counters': dict(self.counters),
+                                'payload_bytes': self.payloads}))
+        return total
+
+
+def start_run(page, started=None):
+    '''
+    Starts profiling the current rerun of a page. Stages opened with
+    stage() in this thread, including the ones inside utils.data_loader,
+    are recorded until finish_run().
+
+    Input: page name and, to record the imports of the page as a stage,
+    the time.perf_counter() taken before them
+    Output: RunProfiler
+    '''
+    _local.profiler = RunProfiler(page, started)
+    return _local.profiler
+
+
+@contextmanager
+def stage(name, kind):
+    '''
+    Times a block of code as a stage of the current rerun. Does nothing
+    outside a profiled rerun (scripts, CLIs, benchmarks).
+
+    Input: stage name and kind (load, clean, filter, aggregate, render)
+    '''
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is None:
+        yield
+        return
+    with profiler.stage(name, kind):
+        yield
+
+
+def milestone(name):
+    '''
+    Records the time elapsed since the start of the current rerun, e.g.
+    'first paint' once the first chart of the page is sent. Milestones
+    get p50/p95 like the stages. Does nothing outside a profiled rerun.
+
+    Input: milestone name
+    '''
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is not None:
+        profiler.stages.append({'stage': name,
+                                'kind': 'milestone',
+                                'seconds': time.perf_counter() - profiler.started,
+                                'rss_delta_bytes': 0})
+
+
+def count(name, value=1):
+    '''
+    Adds to a counter of the current rerun (cache hits, misses, ...).
+    Does nothing outside a profiled rerun.
+
+    Input: counter name and increment
+    '''
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is not None:
+        profiler.counters[name] += value
+
+
+def record_payload(name, nbytes):
+    '''
+    Records the size of what a chart or table sends to the browser in
+    the current rerun, and warns when it is above PAYLOAD_BUDGET_KB.
+    Does nothing outside a profiled rerun.
+
+    Input: chart/table name and size in bytes
+    '''
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is None:
+        return
+    profiler.payloads[name] = nbytes
+    if nbytes > PAYLOAD_BUDGET_KB * 1024:
+        profiler.counters['payload_over_budget'] += 1
+        logger.warning(json.dumps({'event': 'payload_over_budget',
+                                   'page': profiler.page,
+                                   'name': name,
+                                   'bytes': nbytes,
+                                   'budget_bytes': PAYLOAD_BUDGET_KB * 1024}))
+
+
+def current_profiler():
+    '''
+    Profiler of the rerun running in this thread, to hand over to worker
+    threads computing parts of it (see utils.executor).
+
+    Output: RunProfiler or None
+    '''
+    return getattr(_local, 'profiler', None)
+
+
+def finish_run():
+    '''
+    Ends the current rerun: records it in the history and emits its
+    structured log line.
+
+    Output: RunProfiler of the rerun, or None
+    '''
+    profiler = getattr(_local, 'profiler', None)
+    _local.profiler = None
+    if profiler is not None:
+        profiler.finish()
+    return profiler
+
+
+def latency_percentiles(page):
+    '''
+    p50/p95 latency of every stage of a page over the last HISTORY_SIZE
+    reruns of this process.
+
+    Input: page name
+    Output: Dataframe indexed by stage with runs, p50_ms and p95_ms
+    '''
+    # numpy and pandas only for the panel: Home imports this module too
+    import numpy  as np
+    import pandas as pd
+
+    with _history_lock:
+        history = {stage_name: list(seconds) for (name, stage_name), seconds in _history.items()
+                   if name == page}
+    rows = [{'stage': stage_name,
+             'runs': len(seconds),
+             'p50_ms': np.percentile(seconds, 50) * 1000,
+             'p95_ms': np.percentile(seconds, 95) * 1000}
+            for stage_name, seconds in history.items()]
+    return pd.DataFrame(rows, columns=['stage', 'runs', 'p50_ms', 'p95_ms']).set_index('stage')
+
+
+def render_timings(profiler, container, figure_cache=None):
+    '''
+    Optional timings panel: stages of this rerun and p50/p95 per stage,
+    and the totals of the session's figure cache when given.
+    Call it after finish_run(), at the end of the page.
+
+    Input: RunProfiler, a Streamlit container (e.g. st.sidebar) and
+    optionally the FigureCache of the session
+    '''
+    if profiler is None or not container.checkbox('Show timings', value=False):
+        return None
+    import pandas as pd
+
+    container.markdown('##### This run')
+    aux = pd.DataFrame(profiler.stages, columns=['stage', 'kind', 'seconds', 'rss_delta_bytes'])
+    aux['ms'] = (aux.seconds * 1000).round(1)
+    aux['rss_delta_MB'] = (aux.rss_delta_bytes / 2**20).round(2)
+    container.dataframe(aux[['stage', 'kind', 'ms', 'rss_delta_MB']])
+    if profiler.counters:
+        container.markdown('##### Counters')
+        container.dataframe(pd.Series(profiler.counters, name='value').sort_index())
+    if profiler.payloads:
+        container.markdown('##### Payload (KB)')
+        payloads = (pd.Series(profiler.payloads, name='KB') / 1024).round(1).to_frame()
+        payloads['over_budget'] = payloads.KB > PAYLOAD_BUDGET_KB
+        container.dataframe(payloads)
+    if figure_cache is not None:
+        container.markdown('##### Figure cache')
+        container.dataframe(pd.Series(figure_cache.stats(), name='value'))
+    container.markdown('##### p50 / p95 (ms)')
+    container.dataframe(latency_percentiles(profiler.page).round(1))
+    return None
@@ -0,0 +1,86 @@
+# ----------------- Libraries -----------------
+
+import argparse
+import json
+import socket
+import time
+
+import pandas as pd
+
+from utils.data_loader import DATASET_PATH
+
+
+# Rows sent per tick at most 1 / TICKS_PER_SECOND seconds apart
+TICKS_PER_SECOND = 10
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def event_lines(path=DATASET_PATH):
+    '''
+    Rows of a csv file as NDJSON order events: every field as the raw
+    text of the file, as a live source would send it.
+
+    Input: path of the csv file
+    Output: iterator of str (one line each, with its newline)
+    '''
+    raw = pd.read_csv(path, dtype=str, keep_default_na=False)
+    for record in raw.to_dict('records'):
+        yield json.dumps(record) + '\n'
+
+
+def replay(lines, write, rate, limit=None):
+    '''
+    Feeds event lines at a fixed rate.
+
+    Input: iterable of lines, function writing one chunk of text, events
+    per second and the number of events to send (None: all)
+    Output: number of events sent
+    '''
+    per_tick = max(1, round(rate / TICKS_PER_SECOND))
+    interval = per_tick / rate
+    sent = 0
+    chunk = []
+    next_tick = time.perf_counter()
+    for line in lines:
+        if limit is not None and sent >= limit:
+            break
+        chunk.append(line)
+        sent += 1
+        if len(chunk) == per_tick:
+            write(''.join(chunk))
+            chunk = []
+            next_tick += interval
+            time.sleep(max(0.0, next_tick - time.perf_counter()))
+    if chunk:
+        write(''.join(chunk))
+    return sent
+
+
+if __name__ == '__main__':
+    # e.g. python -m utils.replay --rate 50 --to orders.ndjson
+    #      CURRY_STREAM=orders.ndjson streamlit run Home.py
+    parser = argparse.ArgumentParser(description='Replay the rows of the dataset as a live order stream.')
+    parser.add_argument('path', nargs='?', default=DATASET_PATH, help='csv file to replay')
+    parser.add_argument('--to', required=True, help='NDJSON file to append to, or tcp://host:port')
+    parser.add_argument('--rate', type=float, default=20, help='events per second')
+    parser.add_argument('--limit', type=int, help='stop after this many events')
+    parser.add_argument('--loop', action='store_true', help='start over at the end of the file')
+    args = parser.parse_args()
+
+    if args.to.startswith('tcp://'):
+        host, port = args.to[len('tcp://'):].rsplit(':', 1)
+        connection = socket.create_connection((host, int(port)))
+        write = lambda text: connection.sendall(text.encode())
+    else:
+        output = open(args.to, 'a')
+        write = lambda text: (output.write(text), output.flush())
+    sent = 0
+    while True:
+        sent += replay(event_lines(args.path), write, args.rate,
+                       None if args.limit is None else args.limit - sent)
+        if not args.loop or (args.limit is not None and sent >= args.limit):
+            break
+    print('{} events sent to {}'.format(sent, args.to))
@@ -0,0 +1,250 @@
+# ----------------- Libraries -----------------
+
+import argparse
+import datetime
+import json
+import os
+import time
+
+import pandas as pd
+
+from utils.company_view    import (Order_share_by_week, country_maps, order_by_week, order_metric,
+                                   rolling_order_share, traffic_order_city, traffic_order_share)
+from utils.data_loader     import (DATASET_PATH, dataset_version, load_cubes, load_dataset,
+                                   load_sketches)
+from utils.deliverers_view import TOP_K, Ranking, rating_by, rating_per_deliverer, top_delivers
+from utils.executor        import run_sections
+from utils.filters         import apply_filters, date_bounds
+from utils.restaurant_view import (avg_delivery_time_by_city, avg_rating_per_traffic,
+                                   avg_std_time_grapf, delivery_time_per_city_order_type)
+from utils.sketches        import DISTINCT_MODE, filter_sketches
+from utils.sql_backend     import BACKEND, SqlCube, load_database
+from utils.summary         import Summary, summarize, summarize_cubes
+
+
+REPORT_FILE = 'report.json'
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def company_sections(df1, cube, deliverers):
+    '''
+    Sections of the Company View.
+
+    Input: filtered dataset, measures cube and deliverers cube (see filter_page)
+    Output: dict section name -> function without arguments
+    '''
+    return {'order_metric': lambda: order_metric(cube),
+            'traffic_order_share': lambda: traffic_order_share(cube),
+            'traffic_order_city': lambda: traffic_order_city(cube),
+            'order_by_week': lambda: order_by_week(cube),
+            'Order_share_by_week': lambda: Order_share_by_week(cube, deliverers),
+            'rolling_order_share': lambda: rolling_order_share(cube, deliverers),
+            'country_maps': lambda: country_maps(df1)}
+
+
+def deliverers_sections(df1, cube, deliverers, top_k=TOP_K):
+    '''
+    Sections of the Deliverers View.
+
+    Input: filtered dataset, measures cube and deliverers cube (see
+    filter_page), deliverers per city in the rankings
+    Output: dict section name -> function without arguments
+    '''
+    return {'overall_metrics': lambda: summarize(df1),
+            'rating_per_deliverer': lambda: rating_per_deliverer(df1),
+            'rating_per_traffic': lambda: rating_by(cube, 'Road_traffic_density'),
+            'rating_per_weather': lambda: rating_by(cube, 'Weatherconditions'),
+            'top_delivers': lambda: top_delivers(df1, top_k)}
+
+
+def restaurant_sections(df1, cube, deliverers):
+    '''
+    Sections of the Restaurant View.
+
+    Input: filtered dataset, measures cube and deliverers cube (see filter_page)
+    Output: dict section name -> function without arguments
+    '''
+    return {'overall_metrics': lambda: summarize(df1, deliverers),
+            'avg_std_time_grapf': lambda: avg_std_time_grapf(cube),
+            'delivery_time_per_city_order_type': lambda: delivery_time_per_city_order_type(cube),
+            'avg_delivery_time_by_city': lambda: avg_delivery_time_by_city(df1),
+            'avg_rating_per_traffic': lambda: avg_rating_per_traffic(cube)}
+
+
+PAGES = {'company': company_sections,
+         'deliverers': deliverers_sections,
+         'restaurant': restaurant_sections}
+
+
+def live_sections(page, cube, deliverers):
+    '''
+    Sections of the Company and Restaurant views computed from the live
+    cubes (see utils.stream), without the orders themselves: the maps
+    are left out and the header KPIs come from the cubes.
+
+    Input: page name, filtered live measures and deliverers cubes
+    Output: dict section name -> function without arguments
+    '''
+    if page == 'company':
+        sections = company_sections(None, cube, deliverers)
+        sections.pop('country_maps')
+        return sections
+    if page == 'restaurant':
+        sections = restaurant_sections(cube, cube, deliverers)
+        sections['overall_metrics'] = lambda: summarize_cubes(cube, deliverers)
+        return sections
+    raise ValueError('no live sections for page {!r}'.format(page))
+
+
+# Only the Deliverers View has a weather filter in its sidebar
+WEATHER_PAGES = {'deliverers'}
+
+
+def filter_page(page, df1, cubes, date_slider, traffic_options=None, weather_options=None,
+                sketches=None, database=None):
+    '''
+    Applies the sidebar filters of a page to the dataset and the cubes.
+
+    Input: page name (key of PAGES), cleaned dataset, cubes, filters, for
+    the approximate unique-deliverer counts the DistinctSketches (they
+    have no weather dimension) and, for the sqlite backend, the Database
+    of the dataset (see utils.sql_backend)
+    Output: (dataset, measures cube or SqlCube, deliverers cube or
+    filtered sketches)
+    '''
+    if page not in WEATHER_PAGES:
+        weather_options = None
+    if sketches is None:
+        deliverers = apply_filters(cubes.deliverers, date_slider, traffic_options, weather_options)
+    elif weather_options is None:
+        deliverers = filter_sketches(sketches, date_slider, traffic_options)
+    else:
+        raise ValueError('the deliverer sketches cannot be filtered by weather')
+    if database is None:
+        measures = apply_filters(cubes.measures, date_slider, traffic_options, weather_options)
+    else:
+        measures = SqlCube(database, date_slider, traffic_options, weather_options)
+    return (apply_filters(df1, date_slider, traffic_options, weather_options), measures, deliverers)
+
+
+def compute_report(df1, cubes, date_slider, traffic_options=None, weather_options=None, pages=None,
+                   options=None, sketches=None, database=None):
+    '''
+    Computes every section of the pages for one cut-off date and filter
+    set, with the same functions as the Streamlit pages. The sections of
+    all the pages run concurrently in the pool of utils.executor.
+
+    Input: cleaned dataset, cubes, sidebar filters (None keeps all), the
+    pages to compute (default: all of PAGES), the other widgets of the
+    pages as dict page -> keyword arguments, e.g. {'deliverers': {'top_k': 5}},
+    the DistinctSketches to count the unique deliverers approximately
+    (pages with a weather filter keep the exact counts) and the Database
+    to aggregate the measures with SQL
+    Output: dict page -> dict section -> Figure, Dataframe, folium Map or
+    Summary
+    '''
+    pages = pages or list(PAGES)
+    options = options or {}
+    running = {}
+    for page in pages:
+        page_sketches = None if page in WEATHER_PAGES else sketches
+        filtered = filter_page(page, df1, cubes, date_slider, traffic_options, weather_options,
+                               page_sketches, database)
+        running[page] = run_sections(PAGES[page](*filtered, **options.get(page, {})))
+    return {page: {name: sections.result(name) for name in sections.functions}
+            for page, sections in running.items()}
+
+
+def _scalar(value):
+    # NaN (empty selection) is not valid JSON
+    return None if isinstance(value, float) and value != value else value
+
+
+def export_report(report, output_dir, parquet=False, metadata=None):
+    '''
+    Writes a computed report in one pass:
+        - report.json: metrics, tables (split orient) and Plotly specs,
+          which plotly.js can render without Python
+        - <page>.<section>.html: the folium maps
+        - <page>.<section>.parquet: the tables, if parquet is True
+
+    Input: output of compute_report, output folder, parquet flag and the
+    metadata stored in report.json (filters, dataset version, ...)
+    Output: path of report.json
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    document = {'metadata': metadata or {}, 'pages': {}}
+    for page, sections in report.items():
+        payload = document['pages'][page] = {}
+        flat = {}
+        for name, result in sections.items():
+            if isinstance(result, Ranking):
+                flat.update({f'{name}_{field}': table for field, table in result._asdict().items()})
+            else:
+                flat[name] = result
+        for name, result in flat.items():
+            if isinstance(result, Summary):
+                payload[name] = {'kind': 'metrics',
+                                 'values': {key: _scalar(value) for key, value in result._asdict().items()}}
+            elif isinstance(result, pd.DataFrame):
+                payload[name] = {'kind': 'table',
+                                 'data': json.loads(result.to_json(orient='split', date_format='iso'))}
+                if parquet:
+                    table = result.copy()
+                    table.columns = table.columns.astype(str)
+                    table.to_parquet(os.path.join(output_dir, f'{page}.{name}.parquet'))
+            elif hasattr(result, 'get_root'):
+                path = f'{page}.{name}.html'
+                result.save(os.path.join(output_dir, path))
+                payload[name] = {'kind': 'map', 'path': path}
+            else:
+                payload[name] = {'kind': 'figure', 'spec': json.loads(result.to_json())}
+
+    target = os.path.join(output_dir, REPORT_FILE)
+    tmp = target + '.tmp'
+    with open(tmp, 'w') as output:
+        json.dump(document, output, default=str)
+    os.replace(tmp, target)
+    return target
+
+
+if __name__ == '__main__':
+    # e.g. python -m utils.report --cut-off 15-03-2022 --traffic Low Jam --output reports/ --parquet
+    parser = argparse.ArgumentParser(description='Computes every chart of the dashboard without Streamlit.')
+    parser.add_argument('--dataset', default=DATASET_PATH, help='csv file or folder of csv partitions')
+    parser.add_argument('--cut-off', help='DD-MM-YYYY, only orders before this date (default: all)')
+    parser.add_argument('--traffic', nargs='+', help='traffic conditions to keep (default: all)')
+    parser.add_argument('--weather', nargs='+', help='weather conditions to keep (default: all)')
+    parser.add_argument('--pages', nargs='+', choices=list(PAGES), help='pages to compute (default: all)')
+    parser.add_argument('--top-k', type=int, default=TOP_K, help='deliverers per city in the rankings')
+    parser.add_argument('--distinct', choices=['exact', 'approx'], default=DISTINCT_MODE,
+                        help='unique deliverers: exact, or HyperLogLog estimates (about 1.6%% error)')
+    parser.add_argument('--backend', choices=['pandas', 'sqlite'], default=BACKEND,
+                        help='engine of the aggregations on the measures cube')
+    parser.add_argument('--output', default='reports')
+    parser.add_argument('--parquet', action='store_true', help='also write the tables as Parquet')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df1 = load_dataset(args.dataset)
+    cubes = load_cubes(args.dataset)
+    if args.cut_off:
+        date_slider = datetime.datetime.strptime(args.cut_off, '%d-%m-%Y')
+    else:
+        date_slider = date_bounds(df1)[1]
+    report = compute_report(df1, cubes, date_slider, args.traffic, args.weather, args.pages,
+                            options={'deliverers': {'top_k': args.top_k}},
+                            sketches=load_sketches(args.dataset) if args.distinct == 'approx' else None,
+                            database=load_database(args.dataset) if args.backend == 'sqlite' else None)
+    target = export_report(report, args.output, args.parquet,
+                           metadata={'dataset': args.dataset,
+                                     'dataset_version': dataset_version(args.dataset),
+                                     'cut_off': date_slider.strftime('%d-%m-%Y'),
+                                     'traffic': args.traffic,
+                                     'weather': args.weather,
+                                     'distinct': args.distinct,
+                                     'created': datetime.datetime.now().isoformat(timespec='seconds')})
+    print(f'{target} written in {time.perf_counter() - start:.2f}s')
@@ -0,0 +1,61 @@
+# ----------------- Libraries -----------------
+
+import numpy as np
+
+from utils.cubes       import rollup
+from utils.data_loader import decategorize
+
+# plotly is imported when a chart is built (see utils.company_view)
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def avg_std_time_grapf(cube):
+    import plotly.graph_objects as go
+
+    aux = rollup(cube, 'City').reset_index()
+    fig = go.Figure()
+    fig.add_trace(go.Bar(name='Control',
+                         x=aux.City,
+                         y=aux.avg_time,
+                         error_y=dict(type='data',
+                                      array=aux.std_time)))
+    fig.update_layout(barmode='group')
+    return fig
+
+
+def delivery_time_per_city_order_type(cube):
+    aux = rollup(cube, ['City', 'Type_of_order'])
+    aux = aux[['avg_time', 'std_time']].reset_index()
+    return aux
+
+
+def avg_delivery_time_by_city(df1):
+    import plotly.graph_objects as go
+
+    if 'distance_sum' in df1:
+        # live measures cube (see utils.stream): distance summed per cell
+        aux = df1.groupby('City', observed=True)[['distance_sum', 'orders']].sum().sort_index()
+        avg_distance = (aux.distance_sum / aux.orders).rename('distance').reset_index()
+    else:
+        avg_distance = df1.loc[:, ['City', 'distance']].groupby('City', observed=True).mean().sort_index().reset_index()
+    fig = go.Figure(data=[go.Pie(labels=avg_distance.City, 
+                                 values=avg_distance.distance, 
+                                 pull=[0, 0.1, 0])])
+    return fig
+
+
+def avg_rating_per_traffic(cube):
+    import plotly.express as px
+
+    aux = rollup(cube, ['City', 'Road_traffic_density'])
+    aux = decategorize(aux[['avg_time', 'std_time']].reset_index())
+    fig = px.sunburst(aux, 
+                      path=['City', 'Road_traffic_density'],
+                      values='avg_time',
+                      color='std_time',
+                      color_continuous_scale='RdBu',
+                      color_continuous_midpoint=np.average(aux.std_time))
+    return fig
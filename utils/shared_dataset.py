@@ -0,0 +1,144 @@
+# ----------------- Libraries -----------------
+
+import argparse
+import os
+import shutil
+import time
+
+import pandas as pd
+
+from utils.cubes import Cubes
+
+try:
+    import pyarrow         as pa
+    import pyarrow.feather as feather
+except ImportError:  # without pyarrow every process loads its own copy
+    pa = None
+    feather = None
+
+
+# Folder where a loader process publishes the cleaned dataset and its
+# cubes as memory-mapped Arrow files. When set (and pyarrow is there),
+# the pages of every process on the host attach to the published files
+# instead of cleaning the csv into private memory.
+SHARED_DIR = os.environ.get('CURRY_SHARED_DIR')
+
+# Pointer to the current version: a text file with the name of its folder
+CURRENT_FILE = 'CURRENT'
+
+# Published versions kept on disk, so readers still mapping the previous
+# one are not left with deleted files on systems that forbid it
+KEEP_VERSIONS = 2
+
+TABLES = ('dataset',) + Cubes._fields
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def _write_table(df, target):
+    # Uncompressed Arrow IPC, so the columns can be mapped without decoding
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    feather.write_feather(table, target, compression='uncompressed')
+
+
+def _read_table(target):
+    '''
+    Maps an Arrow file into a Dataframe without copying its columns:
+    numeric, datetime and category columns are read-only numpy views and
+    text columns pyarrow-backed strings, all on the page cache shared by
+    every process mapping the file.
+    '''
+    table = feather.read_table(target, memory_map=True)
+    return table.to_pandas(split_blocks=True, date_as_object=False,
+                           types_mapper={pa.string(): pd.StringDtype('pyarrow')}.get)
+
+
+def current_version(directory=SHARED_DIR):
+    '''
+    Version currently published in a folder.
+
+    Output: str, or None when nothing was published yet
+    '''
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as pointer:
+            return pointer.read().strip() or None
+    except OSError:
+        return None
+
+
+def publish(df1, cubes, directory=SHARED_DIR):
+    '''
+    Publishes a cleaned dataset and its cubes as a new version.
+
+    The tables are written in a folder of their own, then the CURRENT
+    pointer is replaced atomically (os.replace): readers see either the
+    old or the new version, never a mix of both. Versions older than
+    KEEP_VERSIONS are removed.
+
+    Input: cleaned dataframe (sorted by Order_Date), Cubes and the folder
+    Output: name of the published version
+    '''
+    os.makedirs(directory, exist_ok=True)
+    version = '{}-{}'.format(time.time_ns(), os.getpid())
+    folder = os.path.join(directory, version)
+    os.makedirs(folder)
+    for name, df in zip(TABLES, (df1,) + tuple(cubes)):
+        _write_table(df, os.path.join(folder, name + '.arrow'))
+
+    pointer = os.path.join(directory, CURRENT_FILE)
+    tmp = '{}.{}.tmp'.format(pointer, os.getpid())
+    with open(tmp, 'w') as output:
+        output.write(version)
+    os.replace(tmp, pointer)
+
+    versions = sorted(entry for entry in os.listdir(directory)
+                      if os.path.isdir(os.path.join(directory, entry)))
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+    return version
+
+
+def attach(directory=SHARED_DIR, version=None):
+    '''
+    Maps a published version (default: the current one).
+
+    Input: folder and version
+    Output: (dataset, Cubes). Read-only: must not be modified in place.
+    '''
+    version = version or current_version(directory)
+    folder = os.path.join(directory, version)
+    df1 = _read_table(os.path.join(folder, 'dataset.arrow'))
+    cubes = Cubes(*[_read_table(os.path.join(folder, name + '.arrow')) for name in Cubes._fields])
+    return df1, cubes
+
+
+if __name__ == '__main__':
+    # e.g. CURRY_SHARED_DIR=/dev/shm/curry python -m utils.shared_dataset --watch 60
+    # The loader reads the csv itself, it must not attach to what it publishes
+    os.environ.pop('CURRY_SHARED_DIR', None)
+    from utils.data_loader import DATASET_PATH, dataset_version, load_cubes, load_dataset
+
+    parser = argparse.ArgumentParser(description='Publish the cleaned dataset for the app processes.')
+    parser.add_argument('path', nargs='?', default=DATASET_PATH,
+                        help='csv file, or a folder of csv partitions')
+    parser.add_argument('--directory', default=SHARED_DIR, help='shared folder (default: CURRY_SHARED_DIR)')
+    parser.add_argument('--watch', type=float, metavar='SECONDS',
+                        help='keep running and publish every new version of the dataset')
+    args = parser.parse_args()
+
+    if feather is None:
+        parser.error('pyarrow is required to publish the dataset')
+    if args.directory is None:
+        parser.error('set --directory or CURRY_SHARED_DIR')
+    published = None
+    while True:
+        version = dataset_version(args.path)
+        if version != published:
+            name = publish(load_dataset(args.path), load_cubes(args.path), args.directory)
+            print('published {} to {}'.format(name, os.path.join(args.directory, name)), flush=True)
+            published = version
+        if args.watch is None:
+            break
+        time.sleep(args.watch)
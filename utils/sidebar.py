@@ -0,0 +1,104 @@
+# ----------------- Libraries -----------------
+
+import functools
+import threading
+
+from utils.filters  import date_bounds
+from utils.versions import replace_version
+
+
+LOGO_PATH = 'logo.jpg'
+
+# Choices of the filter widgets: {dataset_version: dict}
+_choices = {}
+_choices_lock = threading.Lock()
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+@functools.lru_cache(maxsize=None)
+def logo(path=LOGO_PATH):
+    '''
+    Company logo, decoded once per process instead of on every rerun.
+    PIL is only imported here.
+
+    Input: path of the image
+    Output: PIL Image (shared: must not be modified)
+    '''
+    from PIL import Image
+    image = Image.open(path)
+    image.load()
+    return image
+
+
+def filter_choices(df1, version):
+    '''
+    Limits of the cut-off date and options of the traffic and weather
+    filters, computed once per dataset version instead of scanning the
+    dataset on every rerun.
+
+    Input: cleaned (unfiltered) dataset and its version
+    Output: dict with first_date, last_date, traffic and weather
+    '''
+    with _choices_lock:
+        choices = _choices.get(version)
+    if choices is None:
+        first_date, last_date = date_bounds(df1)
+        choices = {'first_date': first_date,
+                   'last_date': last_date,
+                   'traffic': df1.Road_traffic_density.unique().tolist(),
+                   'weather': df1.Weatherconditions.unique().tolist()}
+        with _choices_lock:
+            replace_version(_choices, version, choices)
+    return choices
+
+
+def sidebar_header(container):
+    '''
+    Logo and title, on every page.
+
+    Input: Streamlit container (st.sidebar)
+    '''
+    container.image(logo(), width=120)
+    container.markdown('# Cury Company')
+    container.markdown('## Fastest Delivery in Town')
+    container.markdown('''___''')
+
+
+def sidebar_filters(container, df1, version, weather=False):
+    '''
+    Header and filters shared by the dashboard pages: cut-off date,
+    traffic and, if asked, weather conditions. Pages add their own
+    widgets after them and close the sidebar with sidebar_footer.
+
+    Input: Streamlit container (st.sidebar), cleaned dataset, its version
+    and whether the page filters on weather
+    Output: (date_slider, traffic_options, weather_options or None)
+    '''
+    choices = filter_choices(df1, version)
+    sidebar_header(container)
+    container.markdown('## select the cut-off date')
+    date_slider = container.slider('Up to what value?',
+                                   value=choices['last_date'],
+                                   min_value=choices['first_date'],
+                                   max_value=choices['last_date'],
+                                   format='DD-MM-YYYY')
+
+    container.markdown('''___''')
+    traffic_options = container.multiselect('What are the traffic conditions?',
+                                            choices['traffic'],
+                                            default=choices['traffic'])
+    weather_options = None
+    if weather:
+        container.markdown('''___''')
+        weather_options = container.multiselect('What are the weather conditions?',
+                                                choices['weather'],
+                                                default=choices['weather'])
+    return date_slider, traffic_options, weather_options
+
+
+def sidebar_footer(container):
+    container.markdown('''___''')
+    container.markdown('### Powered by Comunidade DS')
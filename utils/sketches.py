@@ -0,0 +1,136 @@
+# ----------------- Libraries -----------------
+
+import os
+
+from typing import NamedTuple
+
+import numpy  as np
+import pandas as pd
+
+from utils.filters import apply_filters
+
+
+# Registers per sketch = 2**HLL_PRECISION. The relative standard error of
+# a HyperLogLog estimate is 1.04 / sqrt(2**p): 1.6% for p = 12, so about
+# 95% of the counts are within 3.3% of the exact value. Each sketch takes
+# 2**p bytes whatever the number of deliverers.
+HLL_PRECISION = 12
+
+# One sketch per combination of these columns; the filters of the pages
+# that use the approximate counts (date and traffic) select sketches
+SKETCH_DIMENSIONS = ['Order_Date', 'Road_traffic_density']
+
+# 'exact' (nunique on the deliverers cube) or 'approx' (HyperLogLog)
+DISTINCT_MODE = os.environ.get('CURRY_DISTINCT', 'exact')
+
+
+class DistinctSketches(NamedTuple):
+    '''
+    HyperLogLog sketches of the Delivery_person_ID values.
+
+        - keys: one row per sketch with the SKETCH_DIMENSIONS, sorted by
+          Order_Date (so utils.filters applies), and the row of its
+          registers in the column 'sketch'
+        - registers: uint8 array of shape (sketches, 2**precision)
+    '''
+    keys: pd.DataFrame
+    registers: np.ndarray
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def _bit_length(values):
+    # Exact bit length of uint64 values: float64 holds 32-bit halves exactly
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+def hash_ids(ids):
+    '''
+    64-bit hashes of the deliverer IDs, each distinct ID hashed once.
+
+    Input: Series of IDs
+    Output: uint64 array
+    '''
+    codes, uniques = pd.factorize(ids)
+    return pd.util.hash_array(np.asarray(uniques, dtype=object))[codes]
+
+
+def build_sketches(df1, precision=HLL_PRECISION):
+    '''
+    One HyperLogLog sketch of the deliverers per (day, traffic). The first
+    precision bits of the hash select a register, which keeps the position
+    of the first set bit of the remaining bits (maximum over the rows).
+
+    Input: cleaned Dataframe and precision
+    Output: DistinctSketches
+    '''
+    hashes = hash_ids(df1.Delivery_person_ID)
+    rest_bits = 64 - precision
+    register = (hashes >> np.uint64(rest_bits)).astype(np.int64)
+    rest = hashes & np.uint64((1 << rest_bits) - 1)
+    rank = (rest_bits - _bit_length(rest) + 1).astype(np.uint8)
+
+    date_codes, dates = pd.factorize(df1.Order_Date, sort=True)
+    traffic = df1.Road_traffic_density.cat
+    combined = date_codes.astype(np.int64) * len(traffic.categories) + traffic.codes.to_numpy()
+    groups, sketch = np.unique(combined, return_inverse=True)
+
+    registers = np.zeros((len(groups), 1 << precision), dtype=np.uint8)
+    np.maximum.at(registers.reshape(-1), sketch * (1 << precision) + register, rank)
+    keys = pd.DataFrame({'Order_Date': dates[groups // len(traffic.categories)],
+                         'Road_traffic_density': pd.Categorical.from_codes(
+                             groups % len(traffic.categories), traffic.categories),
+                         'sketch': np.arange(len(groups))})
+    return DistinctSketches(keys, registers)
+
+
+def filter_sketches(sketches, date_slider, traffic_options=None):
+    '''
+    Sketches of the orders selected by the date and traffic filters.
+
+    Output: DistinctSketches
+    '''
+    keys = apply_filters(sketches.keys, date_slider, traffic_options)
+    return DistinctSketches(keys, sketches.registers)
+
+
+def estimate(registers):
+    '''
+    HyperLogLog estimate of one merged sketch, with the linear counting
+    correction for small cardinalities. 64-bit hashes need no large-range
+    correction.
+
+    Input: uint8 array of 2**p registers
+    Output: float
+    '''
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)))
+    zeros = np.count_nonzero(registers == 0)
+    if raw <= 2.5 * m and zeros > 0:
+        return m * np.log(m / zeros)
+    return raw
+
+
+def distinct_count(sketches, by=None):
+    '''
+    Approximate number of distinct deliverers, merging the sketches
+    (register-wise maximum) overall or per group.
+
+    Input:
+        - sketches: DistinctSketches, usually filtered
+        - by: None, or Series aligned with sketches.keys to group by
+    Output: int, or Series of int per group
+    '''
+    rows = sketches.keys.sketch.to_numpy()
+    if by is None:
+        if len(rows) == 0:
+            return 0
+        return int(round(estimate(sketches.registers[rows].max(axis=0))))
+    counts = {group: int(round(estimate(sketches.registers[rows[positions]].max(axis=0))))
+              for group, positions in pd.Series(by.to_numpy()).groupby(by.to_numpy()).indices.items()}
+    return pd.Series(counts, name='Delivery_person_ID').rename_axis(by.name).sort_index()
@@ -0,0 +1,192 @@
+# ----------------- Libraries -----------------
+
+from typing import NamedTuple
+
+import numpy  as np
+import pandas as pd
+
+from utils.geo import AVG_EARTH_RADIUS_KM, clean_coordinates, haversine_array
+
+
+# Side of a grid cell, in degrees (~5.5 km of latitude)
+CELL_DEGREES = 0.05
+
+# Half of the earth's circumference: a radius covering every point
+MAX_RADIUS_KM = np.pi * AVG_EARTH_RADIUS_KM
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+class GridIndex:
+    '''
+    Grid index over points on the earth, built once at load time.
+
+    Every point gets the id of its cell (row-major over a grid of
+    cell_degrees), and the points are sorted by cell id. The cells of one
+    grid row are then contiguous: a query reads the grid rows of its
+    bounding box with two binary searches each (np.searchsorted) and
+    computes the exact haversine distance on those candidates only,
+    instead of scanning every point.
+
+    Coordinates are repaired with utils.geo.clean_coordinates; the points
+    left without a location are not indexed.
+    '''
+
+    def __init__(self, lat, lng, rows=None, cell_degrees=CELL_DEGREES):
+        '''
+        Input: latitudes and longitudes of the points, their row positions
+        in the dataset (default: 0..n-1) and the side of a cell
+        '''
+        lat, lng = clean_coordinates(lat, lng)
+        rows = np.arange(len(lat)) if rows is None else np.asarray(rows)
+        valid = np.isfinite(lat) & np.isfinite(lng)
+        self.cell = cell_degrees
+        self.n_cols = int(np.ceil(360 / cell_degrees)) + 1
+        self.missing = int((~valid).sum())
+
+        ids = self._cell_row(lat[valid]) * self.n_cols + self._cell_col(lng[valid])
+        order = np.argsort(ids, kind='stable')
+        self.ids = ids[order]
+        self.rows = rows[valid][order]
+        self.lat = lat[valid][order]
+        self.lng = lng[valid][order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _cell_row(self, lat):
+        return np.floor((np.asarray(lat) + 90) / self.cell).astype(np.int64)
+
+    def _cell_col(self, lng):
+        return np.clip(np.floor((np.asarray(lng) + 180) / self.cell).astype(np.int64), 0, self.n_cols - 1)
+
+    def within(self, lat, lng, radius_km):
+        '''
+        Points within a distance of a location.
+
+        The bounding box of the circle is exact for a sphere: the latitude
+        spans radius / R radians, the longitude asin(sin(radius / R) /
+        cos(lat)), or every longitude when the circle covers a pole.
+
+        Input: latitude and longitude in degrees and the radius in km
+        Output: (row positions in ascending order, distances in km)
+        '''
+        angle = min(radius_km / AVG_EARTH_RADIUS_KM, np.pi)
+        dlat = np.degrees(angle)
+        if abs(lat) + dlat >= 90:
+            dlng = 180
+        else:
+            dlng = np.degrees(np.arcsin(min(1.0, np.sin(angle) / np.cos(np.radians(lat)))))
+
+        grid_rows = np.arange(self._cell_row(max(lat - dlat, -90)), self._cell_row(min(lat + dlat, 90)) + 1)
+        if dlng >= 180:
+            first_col, last_col = 0, self.n_cols - 1
+        else:
+            first_col, last_col = self._cell_col(lng - dlng), self._cell_col(lng + dlng)
+        starts = np.searchsorted(self.ids, grid_rows * self.n_cols + first_col, side='left')
+        ends = np.searchsorted(self.ids, grid_rows * self.n_cols + last_col, side='right')
+        candidates = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)]
+                                    or [np.array([], dtype=np.int64)])
+
+        distances = haversine_array(lat, lng, self.lat[candidates], self.lng[candidates])
+        keep = distances <= radius_km
+        rows, distances = self.rows[candidates[keep]], distances[keep]
+        order = np.argsort(rows, kind='stable')
+        return rows[order], distances[order]
+
+    def nearest(self, lat, lng, k):
+        '''
+        The k points closest to a location. The radius searched starts at
+        one cell and doubles until k points are found: within() returns
+        every point of the circle, so the k closest are among them.
+
+        Input: latitude and longitude in degrees and the number of points
+        Output: (row positions, distances in km), closest first
+        '''
+        k = min(k, len(self))
+        radius = self.cell * np.pi / 180 * AVG_EARTH_RADIUS_KM
+        while True:
+            rows, distances = self.within(lat, lng, radius)
+            if len(rows) >= k or radius >= MAX_RADIUS_KM:
+                break
+            radius *= 2
+        order = np.argsort(distances, kind='stable')[:k]
+        return rows[order], distances[order]
+
+    def densest(self):
+        '''
+        Centroid of the points of the fullest cell, a sensible default
+        location for the queries.
+
+        Output: (latitude, longitude), or None when no point is indexed
+        '''
+        if not len(self):
+            return None
+        starts = np.flatnonzero(np.r_[True, self.ids[1:] != self.ids[:-1]])
+        sizes = np.diff(np.r_[starts, len(self.ids)])
+        start = starts[np.argmax(sizes)]
+        cell = slice(start, start + sizes.max())
+        return float(self.lat[cell].mean()), float(self.lng[cell].mean())
+
+
+class SpatialIndex(NamedTuple):
+    '''
+    Grid indexes of the cleaned dataset.
+
+        - restaurants: distinct restaurant locations, each pointing to the
+          first order placed there
+        - deliveries: the delivery location of every order
+    '''
+    restaurants: GridIndex
+    deliveries: GridIndex
+
+
+def build_spatial_index(df1):
+    '''
+    Indexes the restaurant and delivery locations of the dataset, once
+    per dataset version (see utils.data_loader.load_spatial_index).
+
+    Input: cleaned Dataframe
+    Output: SpatialIndex, with row positions in that dataframe
+    '''
+    lat, lng = clean_coordinates(df1.Restaurant_latitude, df1.Restaurant_longitude)
+    _, first = np.unique(np.column_stack([lat, lng]), axis=0, return_index=True)
+    first.sort()
+    restaurants = GridIndex(lat[first], lng[first], rows=first)
+    deliveries = GridIndex(df1.Delivery_location_latitude, df1.Delivery_location_longitude)
+    return SpatialIndex(restaurants, deliveries)
+
+
+def orders_within(df1, index, lat, lng, radius_km):
+    '''
+    Orders delivered within radius_km of a location.
+
+    Input: the dataset the index was built on (unfiltered), SpatialIndex,
+    latitude, longitude and radius
+    Output: Dataframe of the orders, still sorted by Order_Date (the
+            filters of utils.filters apply), with their delivery_km
+    '''
+    rows, distances = index.deliveries.within(lat, lng, radius_km)
+    return df1.iloc[rows].assign(delivery_km=distances)
+
+
+def nearest_restaurants(df1, index, lat, lng, k=10):
+    '''
+    Restaurant locations closest to a location, as a table.
+
+    Input: the dataset the index was built on (unfiltered), SpatialIndex,
+    latitude, longitude and number of restaurants
+    Output: Dataframe with the restaurant (prefix of the deliverer ID),
+            City, the repaired coordinates and the distance in km,
+            closest first
+    '''
+    rows, distances = index.restaurants.nearest(lat, lng, k)
+    lat_found, lng_found = clean_coordinates(df1.Restaurant_latitude.to_numpy()[rows],
+                                             df1.Restaurant_longitude.to_numpy()[rows])
+    return pd.DataFrame({'Restaurant': df1.Restaurant_ID.to_numpy()[rows].astype(str),
+                         'City': df1.City.to_numpy()[rows].astype(str),
+                         'latitude': lat_found,
+                         'longitude': lng_found,
+                         'distance_km': distances.round(2)})
@@ -0,0 +1,202 @@
+# ----------------- Libraries -----------------
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+import numpy  as np
+import pandas as pd
+
+from utils.cubes       import CUBE_DIMENSIONS, MEASURES, mean_std
+from utils.data_loader import DATASET_PATH, dataset_version, load_cubes
+from utils.profiling   import stage
+
+
+# 'pandas' (groupbys on the in-memory cube) or 'sqlite' (queries on the
+# database file shared by every worker process). Only the aggregations
+# of the measures cube move to SQL: every worker still loads its own
+# dataset and cubes, which the maps, the rankings and the unique
+# deliverer counts need, so this backend does not reduce memory. One
+# copy per host is the shared mode of utils.shared_dataset
+BACKEND = os.environ.get('CURRY_BACKEND', 'pandas')
+
+# Bump whenever the tables of the database change
+DATABASE_VERSION = '1'
+
+# Open databases of this process: {path: Database}
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def database_path(path=DATASET_PATH):
+    '''
+    Location of the database of a dataset: next to the csv file (or the
+    folder of partitions), '.sqlite' extension.
+    '''
+    return os.path.splitext(os.path.normpath(path))[0] + '.sqlite'
+
+
+def _version_stamp(path):
+    return json.dumps([DATABASE_VERSION, dataset_version(path)])
+
+
+def write_database(measures, target, stamp):
+    '''
+    Writes the measures cube into a SQLite file. Dimensions are stored as
+    codes (days since 1970-01-01 for Order_Date, category codes for the
+    others) with their labels in a separate table, so the queries group
+    on integers and return the categories in the pandas order.
+
+    The file is written next to the target under the id of this process
+    and renamed, so readers never see a partial database and processes
+    writing it at the same time never touch each other's file.
+
+    Input: measures cube, path of the database and version stamp
+    '''
+    tmp = '{}.{}.tmp'.format(target, os.getpid())
+    # left over by a crashed process that had the same id
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    table = pd.DataFrame({'Order_Date': (measures.Order_Date.to_numpy()
+                                         .astype('datetime64[D]').astype(np.int64))})
+    labels = []
+    for column in CUBE_DIMENSIONS[1:]:
+        table[column] = measures[column].cat.codes.to_numpy()
+        labels += [(column, code, label) for code, label in enumerate(measures[column].cat.categories)]
+    for column in MEASURES:
+        table[column] = measures[column].to_numpy()
+
+    with sqlite3.connect(tmp) as connection:
+        table.to_sql('measures', connection, index=False)
+        connection.execute('CREATE INDEX measures_date ON measures (Order_Date)')
+        connection.execute('CREATE TABLE labels (dimension TEXT, code INTEGER, label TEXT)')
+        connection.executemany('INSERT INTO labels VALUES (?, ?, ?)', labels)
+        connection.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+        connection.execute("INSERT INTO meta VALUES ('version', ?)", (stamp,))
+    connection.close()
+    os.replace(tmp, target)
+
+
+def _stamp_of(target):
+    try:
+        connection = sqlite3.connect('file:{}?mode=ro'.format(target), uri=True)
+        try:
+            row = connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        finally:
+            connection.close()
+    except sqlite3.Error:
+        return None
+    return None if row is None else row[0]
+
+
+class Database:
+    '''
+    Read-only access to the database file of a dataset. SQLite
+    connections cannot be shared between threads, so every thread (the
+    page scripts and the section workers) opens its own.
+    '''
+
+    def __init__(self, target, stamp):
+        self.target = target
+        self.stamp = stamp
+        self.local = threading.local()
+        connection = self.connection()
+        self.labels = {dimension: list(group.label)
+                       for dimension, group in pd.read_sql('SELECT * FROM labels ORDER BY dimension, code',
+                                                           connection).groupby('dimension')}
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect('file:{}?mode=ro'.format(self.target), uri=True,
+                                         check_same_thread=False)
+            self.local.connection = connection
+        return connection
+
+
+def load_database(path=DATASET_PATH):
+    '''
+    Database of the current version of the dataset, written from its
+    measures cube the first time any worker process needs it. It holds
+    the measures cube only: the callers keep the dataset and the cubes
+    of load_dataset and load_cubes in memory.
+
+    Input: path of the csv file or of a folder of csv files
+    Output: Database
+    '''
+    target = database_path(path)
+    stamp = _version_stamp(path)
+    with _databases_lock:
+        database = _databases.get(target)
+        if database is not None and database.stamp == stamp:
+            return database
+        if _stamp_of(target) != stamp:
+            with stage('write database', 'load'):
+                write_database(load_cubes(path).measures, target, stamp)
+        database = Database(target, stamp)
+        _databases[target] = database
+    return database
+
+
+class SqlCube:
+    '''
+    Filtered measures cube living in the database. Goes wherever a
+    filtered measures cube goes: utils.cubes.rollup runs the aggregation
+    as a query and returns the same dataframe as the pandas path.
+    '''
+
+    def __init__(self, database, date_slider, traffic_options=None, weather_options=None):
+        self.database = database
+        self.date_slider = date_slider
+        self.traffic_options = traffic_options
+        self.weather_options = weather_options
+
+    def _where(self):
+        # Order_Date < cut-off, in days: a cut-off within a day keeps that day
+        day = np.ceil((pd.Timestamp(self.date_slider) - pd.Timestamp(0)) / pd.Timedelta(days=1))
+        clauses, parameters = ['Order_Date < ?'], [int(day)]
+        for column, options in [('Road_traffic_density', self.traffic_options),
+                                ('Weatherconditions', self.weather_options)]:
+            if options is None:
+                continue
+            labels = self.database.labels[column]
+            codes = [labels.index(option) for option in options if option in labels]
+            clauses.append('{} IN ({})'.format(column, ', '.join('?' * len(codes)) or 'NULL'))
+            parameters += codes
+        return ' AND '.join(clauses), parameters
+
+    def rollup(self, by):
+        '''
+        Same output as utils.cubes.rollup on the filtered pandas cube.
+        '''
+        by = [by] if isinstance(by, str) else list(by)
+        where, parameters = self._where()
+        query = 'SELECT {dims}, {sums} FROM measures WHERE {where} GROUP BY {dims} ORDER BY {dims}'.format(
+            dims=', '.join(by),
+            sums=', '.join('SUM({0}) AS {0}'.format(column) for column in MEASURES),
+            where=where)
+        aux = pd.read_sql(query, self.database.connection(), params=parameters)
+        for column in by:
+            if column == 'Order_Date':
+                aux[column] = pd.to_datetime(aux[column], unit='D')
+            else:
+                aux[column] = pd.Categorical.from_codes(aux[column], self.database.labels[column])
+        aux = aux.set_index(by if len(by) > 1 else by[0])
+        aux['avg_time'], aux['std_time'] = mean_std(aux.orders, aux.time_sum, aux.time_sumsq)
+        aux['avg_rating'], aux['std_rating'] = mean_std(aux.rating_count, aux.rating_sum, aux.rating_sumsq)
+        return aux.drop(columns=MEASURES[1:])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write the database of the sqlite backend.')
+    parser.add_argument('path', nargs='?', default=DATASET_PATH,
+                        help='csv file, or a folder of csv partitions')
+    args = parser.parse_args()
+    database = load_database(args.path)
+    print('database written to {}'.format(database.target))
@@ -0,0 +1,347 @@
+# ----------------- Libraries -----------------
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy  as np
+import pandas as pd
+
+from utils.cubes       import CUBE_DIMENSIONS, MEASURES, Cubes
+from utils.data_loader import CATEGORY_COLUMNS, prepare_dataset
+from utils.filters     import apply_filters
+
+
+# Source of the live orders: a newline-delimited JSON file, followed as
+# it grows, or 'tcp://host:port' to listen for NDJSON lines on a local
+# socket. Unset: no live mode.
+STREAM_SOURCE = os.environ.get('CURRY_STREAM')
+
+# Seconds between two refreshes of the live pages
+REFRESH_SECONDS = float(os.environ.get('CURRY_STREAM_REFRESH', 2))
+
+# Events cleaned and added together: at most BATCH_SIZE, at least every
+# BATCH_SECONDS while events arrive
+BATCH_SIZE = 500
+BATCH_SECONDS = 0.5
+
+# Pause when the followed file has no new line
+POLL_SECONDS = 0.2
+
+# Fields of an order event: the columns of train.csv, as text
+RAW_COLUMNS = ['ID', 'Delivery_person_ID', 'Delivery_person_Age', 'Delivery_person_Ratings',
+               'Restaurant_latitude', 'Restaurant_longitude', 'Delivery_location_latitude',
+               'Delivery_location_longitude', 'Order_Date', 'Time_Orderd', 'Time_Order_picked',
+               'Weatherconditions', 'Road_traffic_density', 'Vehicle_condition', 'Type_of_order',
+               'Type_of_vehicle', 'multiple_deliveries', 'Festival', 'City', 'Time_taken(min)']
+
+# Columns pandas parses as numbers when reading train.csv; the others are
+# kept as text, so clean_code sees the events as it sees the csv
+EVENT_DTYPES = {'Restaurant_latitude': float, 'Restaurant_longitude': float,
+                'Delivery_location_latitude': float, 'Delivery_location_longitude': float,
+                'Vehicle_condition': int}
+
+# Text columns clean_code turns into numbers: 'NaN' marks a missing value
+# (the row is dropped by the cleaning), anything else must parse
+NUMERIC_TEXT = {'Delivery_person_Age': 'integer', 'multiple_deliveries': 'integer',
+                'Delivery_person_Ratings': 'float'}
+
+# Live cubes also sum the distance, for the Restaurant View
+LIVE_MEASURES = MEASURES + ['distance_sum']
+
+logger = logging.getLogger('curry_company.stream')
+
+_live = None
+_live_lock = threading.Lock()
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def _invalid_rows(events):
+    '''
+    Rows of a raw events dataframe the rules of clean_code cannot parse:
+    non-numeric coordinates or vehicle condition, a number in text that is
+    neither a number nor 'NaN', an Order_Date not in dd-mm-yyyy or a
+    Time_taken(min) without its minutes.
+
+    Input: Dataframe of text columns
+    Output: (boolean Series, dict column -> number of invalid values)
+    '''
+    invalid = {}
+    for column, dtype in EVENT_DTYPES.items():
+        numbers = pd.to_numeric(events[column].str.strip(), errors='coerce')
+        invalid[column] = numbers.isna()
+        if dtype is int:
+            invalid[column] |= numbers.notna() & (numbers % 1 != 0)
+    for column, kind in NUMERIC_TEXT.items():
+        text = events[column].str.strip()
+        numbers = pd.to_numeric(text, errors='coerce')
+        invalid[column] = numbers.isna() & (text != 'NaN')
+        if kind == 'integer':
+            invalid[column] |= numbers.notna() & (numbers % 1 != 0)
+    invalid['Order_Date'] = pd.to_datetime(events.Order_Date.str.strip(), format='%d-%m-%Y',
+                                           errors='coerce').isna()
+    minutes = events['Time_taken(min)'].str.replace('(min)', '', regex=False).str.strip()
+    invalid['Time_taken(min)'] = ~minutes.str.fullmatch(r'\d+')
+
+    rows = np.zeros(len(events), dtype=bool)
+    for mask in invalid.values():
+        rows |= mask.to_numpy()
+    return rows, {column: int(mask.sum()) for column, mask in invalid.items() if mask.any()}
+
+
+def parse_events(lines):
+    '''
+    Turns NDJSON lines into the raw dataframe clean_code expects. Events
+    with a value the cleaning cannot parse are dropped one by one (and
+    logged), so they do not take the rest of their batch with them.
+
+    Input: list of str
+    Output: (Dataframe, number of lines rejected: not JSON, not an
+            object, missing a field or with an unparseable value)
+    '''
+    records = []
+    for line in lines:
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(event, dict) and all(column in event for column in RAW_COLUMNS):
+            records.append(event)
+    events = pd.DataFrame.from_records(records, columns=RAW_COLUMNS).astype(str)
+    invalid, columns = _invalid_rows(events)
+    if invalid.any():
+        logger.warning(json.dumps({'event': 'stream_events_rejected', 'events': int(invalid.sum()),
+                                   'columns': columns}))
+        events = events.loc[~invalid].reset_index(drop=True)
+    dtypes = {column: EVENT_DTYPES.get(column, str) for column in RAW_COLUMNS}
+    numbers = {column: pd.to_numeric(events[column].str.strip()) for column in EVENT_DTYPES}
+    return events.assign(**numbers).astype(dtypes), len(lines) - len(events)
+
+
+class LiveCubes:
+    '''
+    Cubes of the orders received from the stream, updated in place.
+
+    Every batch of cleaned orders is summed into the cells it touches
+    (running counts, sums and sums of squares, so means and variances
+    come from utils.cubes.mean_std as for the static cubes) and its
+    distinct deliverers are added to a set. A snapshot costs O(cells),
+    whatever the number of orders received.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cells = {}
+        self.sums = np.zeros((0, len(LIVE_MEASURES)))
+        self.deliverers = set()
+        self.events = 0
+        self.rejected = 0
+        self.filtered = 0
+        self.batches = 0
+        self.updated = None
+        self._snapshot = (None, None)
+
+    def update(self, df1, rejected=0, filtered=0):
+        '''
+        Adds a batch of cleaned orders.
+
+        Input: Dataframe from prepare_dataset, the number of events of the
+        batch that could not be parsed and the number the cleaning dropped
+        for a 'NaN' field (as it drops them from the csv)
+        '''
+        time_taken = df1['Time_taken(min)'].astype(float)
+        rating = df1.Delivery_person_Ratings.astype(float)
+        batch = (df1[CUBE_DIMENSIONS].assign(orders=1,
+                                             time_sum=time_taken,
+                                             time_sumsq=time_taken ** 2,
+                                             rating_count=rating.notna().astype(int),
+                                             rating_sum=rating.fillna(0),
+                                             rating_sumsq=rating.fillna(0) ** 2,
+                                             distance_sum=df1.distance)
+                                     .groupby(CUBE_DIMENSIONS, observed=True)[LIVE_MEASURES]
+                                     .sum())
+        pairs = set(df1[CUBE_DIMENSIONS + ['Delivery_person_ID']].itertuples(index=False, name=None))
+        with self.lock:
+            rows = [self.cells.setdefault(key, len(self.cells)) for key in batch.index]
+            if len(self.cells) > len(self.sums):
+                grown = np.zeros((max(len(self.cells), 2 * len(self.sums)), len(LIVE_MEASURES)))
+                grown[:len(self.sums)] = self.sums
+                self.sums = grown
+            np.add.at(self.sums, rows, batch.to_numpy(dtype=float))
+            self.deliverers |= pairs
+            self.events += len(df1) + rejected + filtered
+            self.rejected += rejected
+            self.filtered += filtered
+            self.batches += 1
+            self.updated = time.time()
+
+    def reject(self, count):
+        '''
+        Counts events that could not be parsed or cleaned.
+        '''
+        with self.lock:
+            self.events += count
+            self.rejected += count
+            self.updated = time.time()
+
+    def snapshot(self):
+        '''
+        Current cubes, in the layout of utils.cubes (sorted by Order_Date,
+        category dimensions) plus the distance_sum measure. Rebuilt only
+        when a batch arrived since the last call.
+
+        Output: Cubes
+        '''
+        with self.lock:
+            if self._snapshot[0] == self.batches:
+                return self._snapshot[1]
+            batches = self.batches
+            keys = list(self.cells)
+            sums = self.sums[:len(keys)].copy()
+            pairs = list(self.deliverers)
+
+        measures = pd.DataFrame(keys, columns=CUBE_DIMENSIONS)
+        measures[LIVE_MEASURES] = sums
+        measures = measures.astype({'orders': np.int64, 'rating_count': np.int64})
+        deliverers = pd.DataFrame(pairs, columns=CUBE_DIMENSIONS + ['Delivery_person_ID'])
+        cubes = Cubes(*[_as_cube(aux) for aux in (measures, deliverers)])
+        with self.lock:
+            self._snapshot = (batches, cubes)
+        return cubes
+
+    def status(self):
+        '''
+        Counters of the stream: events received, rejected (not parseable,
+        see parse_events) and filtered (dropped by the 'NaN' rules of
+        clean_code), batches and time of the last update.
+        '''
+        with self.lock:
+            return {'events': self.events,
+                    'rejected': self.rejected,
+                    'filtered': self.filtered,
+                    'batches': self.batches,
+                    'updated': self.updated}
+
+
+def _as_cube(aux):
+    # Same dtypes and order as the static cubes, so the filters and the
+    # chart functions apply unchanged
+    aux['Order_Date'] = pd.to_datetime(aux.Order_Date)
+    for column in CUBE_DIMENSIONS:
+        if column in CATEGORY_COLUMNS:
+            aux[column] = pd.Categorical(aux[column], categories=sorted(aux[column].unique()))
+    return aux.sort_values('Order_Date', kind='mergesort', ignore_index=True)
+
+
+def filter_live(live, traffic_options=None, weather_options=None):
+    '''
+    Snapshot of the live cubes with the categorical filters of a page.
+    The cut-off date does not apply: every order received is kept.
+
+    Input: LiveCubes and the selected options (None keeps all)
+    Output: (measures cube, deliverers cube)
+    '''
+    cubes = live.snapshot()
+    return tuple(apply_filters(aux, pd.Timestamp.max, traffic_options, weather_options)
+                 for aux in cubes)
+
+
+async def follow_file(path, queue, poll=POLL_SECONDS):
+    '''
+    Puts every line of a NDJSON file in the queue, then the lines
+    appended to it (like tail -f). Waits for the file if it does not
+    exist yet; a partial last line is kept until its newline arrives.
+    '''
+    while not os.path.exists(path):
+        await asyncio.sleep(poll)
+    with open(path) as source:
+        pending = ''
+        while True:
+            line = source.readline()
+            if not line:
+                await asyncio.sleep(poll)
+                continue
+            pending += line
+            if pending.endswith('\n'):
+                await queue.put(pending)
+                pending = ''
+
+
+async def serve_socket(host, port, queue):
+    '''
+    Listens on a local socket and puts every NDJSON line received, from
+    any number of clients, in the queue.
+    '''
+    async def handle(reader, writer):
+        while line := await reader.readline():
+            await queue.put(line.decode())
+        writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+async def consume(queue, live, batch_size=BATCH_SIZE, batch_seconds=BATCH_SECONDS):
+    '''
+    Cleans the queued events in batches, with the rules of clean_code,
+    and adds them to the live cubes. Events the cleaning cannot parse are
+    dropped by parse_events; a batch that still fails is counted as
+    rejected and logged, and the consumer goes on with the next one.
+    '''
+    loop = asyncio.get_running_loop()
+    while True:
+        lines = [await queue.get()]
+        deadline = loop.time() + batch_seconds
+        while len(lines) < batch_size:
+            try:
+                lines.append(await asyncio.wait_for(queue.get(), deadline - loop.time()))
+            except asyncio.TimeoutError:
+                break
+        try:
+            events, rejected = parse_events(lines)
+            df1 = prepare_dataset(events)
+        except (ValueError, TypeError, KeyError, AttributeError) as error:
+            logger.warning(json.dumps({'event': 'stream_batch_rejected', 'lines': len(lines),
+                                       'error': repr(error)}))
+            live.reject(len(lines))
+            continue
+        live.update(df1, rejected=rejected, filtered=len(events) - len(df1))
+
+
+async def run_stream(source, live):
+    '''
+    Reads the source (NDJSON file or tcp://host:port) into the live cubes
+    until cancelled.
+    '''
+    queue = asyncio.Queue(maxsize=10 * BATCH_SIZE)
+    if source.startswith('tcp://'):
+        host, port = source[len('tcp://'):].rsplit(':', 1)
+        reader = serve_socket(host, int(port), queue)
+    else:
+        reader = follow_file(source, queue)
+    await asyncio.gather(reader, consume(queue, live))
+
+
+def start_stream(source=STREAM_SOURCE):
+    '''
+    Live cubes of the process, fed by an asyncio consumer running in a
+    background thread started on first use.
+
+    Input: NDJSON file or tcp://host:port
+    Output: LiveCubes
+    '''
+    global _live
+    with _live_lock:
+        if _live is None:
+            _live = LiveCubes()
+            thread = threading.Thread(target=asyncio.run, args=(run_stream(source, _live),),
+                                      name='curry-stream', daemon=True)
+            thread.start()
+        return _live
@@ -0,0 +1,106 @@
+# ----------------- Libraries -----------------
+
+from typing import NamedTuple, Optional
+
+import numpy  as np
+import pandas as pd
+
+from utils.cubes    import mean_std, rollup
+from utils.sketches import DistinctSketches, distinct_count
+
+
+class Summary(NamedTuple):
+    '''
+    Header KPIs of the Restaurant and Deliverers views, for one filtered
+    dataset. Means and standard deviations (ddof=1) are not rounded;
+    None/NaN when the selection has no matching rows.
+    '''
+    orders: int
+    unique_deliverers: int
+    avg_distance: float
+    avg_festival: float
+    std_festival: float
+    avg_no_festival: float
+    std_no_festival: float
+    oldest_deliverer: Optional[int]
+    youngest_deliverer: Optional[int]
+    best_vehicle_condition: Optional[int]
+    worst_vehicle_condition: Optional[int]
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def _min_max(column):
+    values = column.to_numpy()
+    if len(values) == 0:
+        return None, None
+    return values.min().item(), values.max().item()
+
+
+def summarize(df1, deliverers=None):
+    '''
+    Computes every header KPI of the pages at once. The delivery time is
+    grouped by festival flag with a single bincount of the category codes
+    (count, sum and sum of squares per flag) instead of one filter and
+    groupby per (festival, avg|std) pair.
+
+    Input: cleaned Dataframe, usually filtered, and optionally the
+    filtered DistinctSketches to estimate the unique deliverers from
+    Output: Summary
+    '''
+    festival = df1.Festival.cat.codes.to_numpy()
+    flags = len(df1.Festival.cat.categories)
+    time = df1['Time_taken(min)'].to_numpy(dtype=float)
+    count = pd.Series(np.bincount(festival, minlength=flags), index=df1.Festival.cat.categories)
+    total = pd.Series(np.bincount(festival, weights=time, minlength=flags), index=count.index)
+    total_sq = pd.Series(np.bincount(festival, weights=time * time, minlength=flags), index=count.index)
+    mean, std = mean_std(count, total, total_sq)
+    mean, std = mean.reindex(['Yes', 'No']), std.reindex(['Yes', 'No'])
+
+    if isinstance(deliverers, DistinctSketches):
+        unique_deliverers = distinct_count(deliverers)
+    else:
+        unique_deliverers = df1.Delivery_person_ID.nunique()
+    youngest, oldest = _min_max(df1.Delivery_person_Age)
+    worst, best = _min_max(df1.Vehicle_condition)
+    return Summary(orders=len(df1),
+                   unique_deliverers=unique_deliverers,
+                   avg_distance=float(df1.distance.mean()),
+                   avg_festival=float(mean['Yes']),
+                   std_festival=float(std['Yes']),
+                   avg_no_festival=float(mean['No']),
+                   std_no_festival=float(std['No']),
+                   oldest_deliverer=oldest,
+                   youngest_deliverer=youngest,
+                   best_vehicle_condition=best,
+                   worst_vehicle_condition=worst)
+
+
+def summarize_cubes(measures, deliverers):
+    '''
+    Header KPIs that the cubes hold, for the live views (see utils.stream):
+    orders, unique deliverers, festival delivery times and, when the
+    cube sums it, the average distance. The per-deliverer extremes need
+    the orders themselves and are None.
+
+    Input: measures and deliverers cubes, usually filtered
+    Output: Summary
+    '''
+    festival = rollup(measures, 'Festival').reindex(['Yes', 'No'])
+    orders = int(measures.orders.sum())
+    avg_distance = np.nan
+    if 'distance_sum' in measures and orders:
+        avg_distance = float(measures.distance_sum.sum() / orders)
+    return Summary(orders=orders,
+                   unique_deliverers=deliverers.Delivery_person_ID.nunique(),
+                   avg_distance=avg_distance,
+                   avg_festival=float(festival.avg_time['Yes']),
+                   std_festival=float(festival.std_time['Yes']),
+                   avg_no_festival=float(festival.avg_time['No']),
+                   std_no_festival=float(festival.std_time['No']),
+                   oldest_deliverer=None,
+                   youngest_deliverer=None,
+                   best_vehicle_condition=None,
+                   worst_vehicle_condition=None)
@@ -0,0 +1,124 @@
+# ----------------- Libraries -----------------
+
+import numpy  as np
+import pandas as pd
+
+
+# Calendar buckets of bucket_codes
+BUCKETS = ['day', 'week', 'iso_week', 'month']
+
+# Trailing windows of the trend lines, in days
+ROLLING_WINDOWS = [7, 28]
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def day_codes(dates):
+    '''
+    Days since 1970-01-01 (a Thursday) of datetime values.
+
+    Input: Series, Index or array of datetimes
+    Output: int64 array
+    '''
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+
+def bucket_codes(dates, bucket):
+    '''
+    Integer code of the bucket of every date, with integer arithmetic
+    only (no string formatting). Consecutive buckets have consecutive
+    codes, so they can be grouped, counted and reindexed as integers:
+        - day: days since 1970-01-01
+        - week: weeks from Sunday to Saturday, as strftime('%U')
+        - iso_week: weeks from Monday to Sunday (ISO 8601)
+        - month: months since January 1970
+
+    Input: datetimes and one of BUCKETS
+    Output: int64 array
+    '''
+    if bucket == 'month':
+        return np.asarray(dates, dtype='datetime64[M]').astype(np.int64)
+    day = day_codes(dates)
+    if bucket == 'day':
+        return day
+    if bucket == 'week':
+        return (day + 4) // 7
+    if bucket == 'iso_week':
+        return (day + 3) // 7
+    raise ValueError('unknown bucket {!r}, expected one of {}'.format(bucket, BUCKETS))
+
+
+def bucket_start(codes, bucket):
+    '''
+    First day of the buckets of bucket_codes.
+
+    Output: datetime64[ns] array
+    '''
+    codes = np.asarray(codes, dtype=np.int64)
+    if bucket == 'month':
+        return codes.astype('datetime64[M]').astype('datetime64[ns]')
+    days = {'day': codes, 'week': codes * 7 - 4, 'iso_week': codes * 7 - 3}[bucket]
+    return days.astype('datetime64[D]').astype('datetime64[ns]')
+
+
+def week_of_year(dates):
+    '''
+    strftime('%U') without formatting: weeks start on Sunday and the days
+    before the first Sunday of the year are week 0.
+
+    Output: int64 array
+    '''
+    day = day_codes(dates)
+    year_start = np.asarray(dates, dtype='datetime64[Y]').astype('datetime64[D]').astype(np.int64)
+    weekday = (day + 4) % 7  # Sunday = 0
+    return (day - year_start + 7 - weekday) // 7
+
+
+def week_labels(codes):
+    '''
+    Axis labels of 'week' codes: the week of the year (of their Saturday)
+    when they all fall in one year, their first day otherwise, so the
+    weeks of a long history do not collide.
+
+    Output: array of int or datetime64
+    '''
+    start = bucket_start(codes, 'week')
+    end = start + np.timedelta64(6, 'D')
+    if len(np.unique(end.astype('datetime64[Y]'))) <= 1:
+        return week_of_year(end)
+    return start
+
+
+def fill_days(aux):
+    '''
+    Reindexes a dataframe indexed by date on every day between its first
+    and last date, with zeros on the missing days, so trailing windows
+    cover calendar days.
+
+    Input: Dataframe with a DatetimeIndex of distinct days
+    Output: Dataframe
+    '''
+    if len(aux) == 0:
+        return aux
+    days = day_codes(aux.index)
+    every_day = np.arange(days.min(), days.max() + 1)
+    return (aux.set_axis(days)
+               .reindex(every_day, fill_value=0)
+               .set_axis(pd.DatetimeIndex(bucket_start(every_day, 'day'), name=aux.index.name)))
+
+
+def rolling_sum(values, window):
+    '''
+    Sum of the last window values at every position, from one cumulative
+    sum: O(n) whatever the window. The first window - 1 positions, not
+    covered by a full window, are NaN.
+
+    Input: array of numbers and the window length
+    Output: float array
+    '''
+    values = np.asarray(values)
+    total = np.concatenate([[0], np.cumsum(values)])
+    sums = (total[window:] - total[:-window]) if len(values) >= window else np.array([])
+    return np.concatenate([np.full(min(window - 1, len(values)), np.nan), sums.astype(float)])
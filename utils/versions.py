@@ -0,0 +1,22 @@
+# Caches keyed on the dataset version, shared by the data loader and the
+# sidebar. No import: Home loads the sidebar without the data layer
+
+
+# ==========================================================
+#                       Functions
+# ==========================================================
+
+def replace_version(cache, version, value):
+    '''
+    Stores a result derived from one version of a dataset and drops the
+    ones of its older versions (same path: first item of the version), so
+    a process serving a file that keeps changing holds one of each. Call
+    it with the lock of the cache held.
+
+    Input: dict version -> result, the version and the result
+    Output: the result
+    '''
+    for old_version in [v for v in cache if v[0] == version[0]]:
+        del cache[old_version]
+    cache[version] = value
+    return value